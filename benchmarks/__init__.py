@@ -0,0 +1,9 @@
+""" Driver benchmarks emitting JSON results
+
+Run against an in-process fake server, a server given by host or a
+server started from a mysqld executable with data in a temporary
+directory:
+
+    python -m <package>.benchmarks [--quick] [--host HOST | --mysqld PATH]
+"""
+from .run import run_benchmarks
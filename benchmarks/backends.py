@@ -0,0 +1,88 @@
+from ..driver.commit_tracker import CommitPolicy
+from ..driver.mysql import MySQL
+from .fake_mysql import FakeServer
+
+
+# benchmarks commit once per batch, as blocks committing per batch do
+DRIVER_OPTIONS = {"commit_policy": CommitPolicy.batch}
+
+
+class FakeBackend(object):
+    """ Runs drivers against an in-process fake server
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, connect_latency=0.0):
+        self.server = FakeServer(latency, connect_latency)
+
+    def describe(self):
+        return {"name": self.name, "latency": self.server.latency,
+                "connect_latency": self.server.connect_latency}
+
+    def create_driver(self, target_table, logger, **options):
+        db = MySQL(None, None, "benchmarks", None, None, False, logger,
+                   target_table, **dict(DRIVER_OPTIONS, **options))
+        db.setup_connection = self.server.connect
+        return db
+
+    def break_connections(self):
+        self.server.kill_connections()
+
+    def close(self):
+        pass
+
+
+class ServerBackend(object):
+    """ Runs drivers against a MySQL or MariaDB server, benchmarks use a
+    database of their own which is dropped when done
+    """
+
+    name = "server"
+
+    def __init__(self, host, port, user, password, database="nio_benchmarks"):
+        self._host = host
+        self._port = port
+        self._user = user
+        self._password = password
+        self._database = database
+        self._execute("DROP DATABASE IF EXISTS `{0}`".format(database))
+        self._execute("CREATE DATABASE `{0}`".format(database))
+
+    def describe(self):
+        version = self._execute("SELECT VERSION()")[0][0]
+        return {"name": self.name, "host": self._host, "port": self._port,
+                "database": self._database, "version": version}
+
+    def create_driver(self, target_table, logger, **options):
+        return MySQL(self._host, self._port, self._database, self._user,
+                     self._password, False, logger, target_table,
+                     **dict(DRIVER_OPTIONS, **options))
+
+    def break_connections(self):
+        """ Kills every connection to benchmarks database
+        """
+        rows = self._execute(
+            "SELECT id FROM information_schema.processlist "
+            "WHERE db=%s AND id<>CONNECTION_ID()", [self._database])
+        for (connection_id,) in rows:
+            try:
+                self._execute("KILL {0:d}".format(connection_id))
+            except Exception:
+                # connection ended on its own in the meantime
+                pass
+
+    def close(self):
+        self._execute("DROP DATABASE IF EXISTS `{0}`".format(self._database))
+
+    def _execute(self, statement, args=None):
+        import pymysql
+        connection = pymysql.connect(host=self._host, port=self._port,
+                                     user=self._user, passwd=self._password,
+                                     charset='utf8')
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement, args)
+                return cursor.fetchall()
+        finally:
+            connection.close()
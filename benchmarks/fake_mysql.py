@@ -0,0 +1,289 @@
+import re
+from datetime import datetime
+from itertools import islice
+from threading import Lock
+from time import sleep
+
+import pymysql
+from pymysql.converters import escape_item
+
+
+class FakeServer(object):
+    """ In-process stand-in for a MySQL server
+
+    Understands the statements the driver issues well enough to exercise
+    it end to end without a server: tables and their columns are tracked,
+    inserted rows are only counted and selected rows are generated from
+    column types. A fixed latency can be added to every statement, commit
+    and connect to emulate network round trips.
+    """
+
+    # data types columns are reported with by column definition type
+    DATA_TYPES = {"INTEGER": "int", "BIGINT": "bigint", "BOOLEAN": "tinyint",
+                  "DATETIME": "datetime", "FLOAT": "float",
+                  "DOUBLE": "double", "TEXT": "text", "JSON": "json",
+                  "BLOB": "blob", "LONGBLOB": "longblob"}
+
+    def __init__(self, latency=0.0, connect_latency=0.0,
+                 max_allowed_packet=4194304):
+        """ Create a server
+
+        Args:
+            latency: seconds added to every statement and commit
+            connect_latency: seconds added to every connect
+            max_allowed_packet: largest packet accepted, in bytes
+        """
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.max_allowed_packet = max_allowed_packet
+        self.statements = 0
+        self._lock = Lock()
+        # (columns as (name, data type) tuples, row count) by table
+        self._tables = {}
+        # connections opened before last kill are gone
+        self._generation = 0
+
+    def connect(self):
+        if self.connect_latency:
+            sleep(self.connect_latency)
+        with self._lock:
+            return FakeConnection(self, self._generation)
+
+    def kill_connections(self):
+        """ Makes every open connection fail as if the server went away
+        """
+        with self._lock:
+            self._generation += 1
+
+    def is_alive(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def row_count(self, table):
+        with self._lock:
+            return self._tables[table][1]
+
+    def execute(self, statement, args):
+        """ Executes a statement
+
+        Returns:
+            (affected rows, description, rows) tuple, rows is an iterable
+        """
+        with self._lock:
+            self.statements += 1
+        if self.latency:
+            sleep(self.latency)
+
+        for pattern, handler in self._handlers():
+            match = pattern.match(statement)
+            if match:
+                return handler(match, args)
+        return 0, None, ()
+
+    def _handlers(self):
+        return [
+            (self.SELECT_PACKET, self._select_packet),
+            (self.SELECT_COLUMNS, self._select_columns),
+            (self.SELECT_TABLES, self._select_tables),
+            (self.CREATE_TABLE, self._create_table),
+            (self.ALTER_TABLE, self._alter_table),
+            (self.INSERT, self._insert),
+            (self.LOAD_DATA, self._load_data),
+            (self.SELECT_ALL, self._select_all),
+            (self.DROP_TABLE, self._drop_table)
+        ]
+
+    SELECT_PACKET = re.compile(r"SELECT @@max_allowed_packet")
+    SELECT_COLUMNS = re.compile(
+        r"SELECT table_name, column_name, data_type "
+        r"FROM information_schema.columns")
+    SELECT_TABLES = re.compile(
+        r"SELECT table_name FROM information_schema.tables")
+    CREATE_TABLE = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)\((.*)\)$",
+                              re.DOTALL)
+    ALTER_TABLE = re.compile(r"ALTER TABLE (\w+) (.*)$", re.DOTALL)
+    INSERT = re.compile(r"INSERT INTO (\w+) \(([^)]*)\) VALUES ", re.DOTALL)
+    LOAD_DATA = re.compile(
+        r"LOAD DATA LOCAL INFILE '([^']+)' INTO TABLE (\w+)")
+    SELECT_ALL = re.compile(r"SELECT \* FROM (\w+)(?: LIMIT (\d+))?",
+                            re.IGNORECASE)
+    DROP_TABLE = re.compile(r"DROP TABLE IF EXISTS `?(\w+)`?")
+    COLUMN = re.compile(r"`(\w+)` (\w+)")
+
+    def _select_packet(self, match, args):
+        return 1, (("@@max_allowed_packet",),), [(self.max_allowed_packet,)]
+
+    def _select_columns(self, match, args):
+        tables = args[1:]
+        with self._lock:
+            rows = [(table, name, data_type)
+                    for table in sorted(self._tables) if table in tables
+                    for name, data_type in self._tables[table][0]]
+        return len(rows), (("table_name",), ("column_name",),
+                           ("data_type",)), rows
+
+    def _select_tables(self, match, args):
+        with self._lock:
+            rows = [(table,) for table in sorted(self._tables)]
+        return len(rows), (("table_name",),), rows
+
+    def _create_table(self, match, args):
+        columns = [(name, self.DATA_TYPES.get(sql_type.upper(), "text"))
+                   for name, sql_type in self.COLUMN.findall(match.group(2))]
+        with self._lock:
+            self._tables.setdefault(match.group(1), (columns, 0))
+        return 0, None, ()
+
+    def _alter_table(self, match, args):
+        table = match.group(1)
+        with self._lock:
+            columns, row_count = self._get_table(table)
+            names = {name.lower() for name, _ in columns}
+            added = []
+            for name, sql_type in self.COLUMN.findall(match.group(2)):
+                if name.lower() in names:
+                    raise pymysql.err.OperationalError(
+                        1060, "Duplicate column name '{0}'".format(name))
+                names.add(name.lower())
+                added.append(
+                    (name, self.DATA_TYPES.get(sql_type.upper(), "text")))
+            self._tables[table] = (columns + added, row_count)
+        return 0, None, ()
+
+    def _insert(self, match, args):
+        table = match.group(1)
+        rows = match.string.count("),(", match.end()) + 1
+        self._add_rows(table, match.group(2).replace("`", "").split(","),
+                       rows)
+        return rows, None, ()
+
+    def _load_data(self, match, args):
+        with open(match.group(1), "rb") as load_file:
+            rows = sum(chunk.count(b"\n")
+                       for chunk in iter(lambda: load_file.read(65536), b""))
+        self._add_rows(match.group(2), (), rows)
+        return rows, None, ()
+
+    def _select_all(self, match, args):
+        table = match.group(1)
+        with self._lock:
+            columns, row_count = self._get_table(table)
+        if match.group(2) is not None:
+            row_count = min(row_count, int(match.group(2)))
+        description = tuple((name,) for name, _ in columns)
+        return row_count, description, self._generate_rows(columns,
+                                                           row_count)
+
+    def _drop_table(self, match, args):
+        with self._lock:
+            self._tables.pop(match.group(1), None)
+        return 0, None, ()
+
+    def _add_rows(self, table, column_names, rows):
+        with self._lock:
+            columns, row_count = self._get_table(table)
+            known = {name.lower() for name, _ in columns}
+            for name in column_names:
+                if name.lower() not in known:
+                    raise pymysql.err.OperationalError(
+                        1054, "Unknown column '{0}'".format(name))
+            self._tables[table] = (columns, row_count + rows)
+
+    def _get_table(self, table):
+        try:
+            return self._tables[table]
+        except KeyError:
+            raise pymysql.err.ProgrammingError(
+                1146, "Table '{0}' doesn't exist".format(table))
+
+    @staticmethod
+    def _generate_rows(columns, row_count):
+        now = datetime.now()
+        generators = {
+            "int": lambda index: index,
+            "bigint": lambda index: index,
+            "tinyint": lambda index: index % 2,
+            "float": lambda index: index * 0.5,
+            "double": lambda index: index * 0.5,
+            "datetime": lambda index: now
+        }
+        values = [generators.get(data_type,
+                                 lambda index: "value{0}".format(index))
+                  for _, data_type in columns]
+        return (tuple(value(index) for value in values)
+                for index in range(row_count))
+
+
+class FakeConnection(object):
+    """ Stand-in for a pymysql connection to a FakeServer
+    """
+
+    def __init__(self, server, generation):
+        self._server = server
+        self._generation = generation
+        self._closed = False
+
+    def cursor(self, cursor_class=None):
+        self._check()
+        return FakeCursor(self)
+
+    def escape(self, value, mapping=None):
+        return escape_item(value, "utf8", mapping)
+
+    def ping(self, reconnect=False):
+        self._check()
+
+    def commit(self):
+        self._check()
+        if self._server.latency:
+            sleep(self._server.latency)
+
+    def close(self):
+        self._closed = True
+
+    def execute(self, statement, args):
+        self._check()
+        return self._server.execute(statement, args)
+
+    def _check(self):
+        if self._closed:
+            raise pymysql.err.InterfaceError(0, "Connection is closed")
+        if not self._server.is_alive(self._generation):
+            raise pymysql.err.OperationalError(
+                2006, "MySQL server has gone away")
+
+
+class FakeCursor(object):
+    """ Stand-in for a pymysql cursor, rows are produced on demand
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._rows = iter(())
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, statement, args=None):
+        if isinstance(args, (list, tuple)) and args and \
+                "information_schema" not in statement:
+            statement = statement % tuple(
+                self._connection.escape(arg) for arg in args)
+        self.rowcount, self.description, rows = \
+            self._connection.execute(statement, args)
+        self._rows = iter(rows)
+        return self.rowcount
+
+    def executemany(self, statement, args):
+        return sum(self.execute(statement, arg) for arg in args)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        return list(islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        self._rows = iter(())
@@ -0,0 +1,112 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from time import monotonic, sleep
+
+
+class TemporaryServer(object):
+    """ MySQL or MariaDB server whose data lives in a temporary directory
+    removed on stop, root user has no password
+    """
+
+    def __init__(self, mysqld="mysqld", start_timeout=60):
+        """ Create a server
+
+        Args:
+            mysqld: server executable, name or path
+            start_timeout: seconds to wait for server to accept connections
+        """
+        self._mysqld = shutil.which(mysqld) or mysqld
+        self._start_timeout = start_timeout
+        self._directory = None
+        self._process = None
+        self.host = "127.0.0.1"
+        self.port = None
+        self.user = "root"
+        self.password = ""
+
+    def start(self):
+        self._directory = tempfile.mkdtemp(prefix="nio-mysql-benchmarks-")
+        data_directory = os.path.join(self._directory, "data")
+        self.port = self._free_port()
+        try:
+            self._initialize(data_directory)
+            self._process = subprocess.Popen(
+                [self._mysqld, "--no-defaults",
+                 "--datadir={0}".format(data_directory),
+                 "--socket={0}".format(
+                     os.path.join(self._directory, "mysql.sock")),
+                 "--bind-address={0}".format(self.host),
+                 "--port={0}".format(self.port),
+                 "--local-infile=1",
+                 "--skip-log-bin"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self._wait_until_ready()
+        except:
+            self.stop()
+            raise
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _initialize(self, data_directory):
+        """ Creates system tables, MySQL initializes through the server
+        executable while MariaDB ships an install script
+        """
+        try:
+            subprocess.run(
+                [self._mysqld, "--no-defaults", "--initialize-insecure",
+                 "--datadir={0}".format(data_directory)],
+                check=True, stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE)
+            return
+        except subprocess.CalledProcessError:
+            install_db = shutil.which("mariadb-install-db") or \
+                shutil.which("mysql_install_db")
+            if install_db is None:
+                raise
+        subprocess.run(
+            [install_db, "--no-defaults", "--auth-root-authentication-method"
+             "=normal", "--datadir={0}".format(data_directory)],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def _wait_until_ready(self):
+        import pymysql
+        deadline = monotonic() + self._start_timeout
+        while True:
+            if self._process.poll() is not None:
+                raise RuntimeError("Server exited with code {0}".format(
+                    self._process.returncode))
+            try:
+                pymysql.connect(host=self.host, port=self.port,
+                                user=self.user, passwd=self.password).close()
+                return
+            except pymysql.err.OperationalError:
+                if monotonic() > deadline:
+                    raise
+                sleep(0.2)
+
+    @staticmethod
+    def _free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
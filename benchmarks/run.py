@@ -0,0 +1,92 @@
+import argparse
+import json
+import logging
+import platform
+import sys
+from datetime import datetime, timezone
+
+from .backends import FakeBackend, ServerBackend
+from .local_server import TemporaryServer
+from .suites import Suites
+
+BENCHMARKS = ["add_items", "insert_modes", "insert_workers",
+              "schema_evolution", "query", "reconnect"]
+
+
+def run_benchmarks(backend, rows=20000, quick=False, names=None,
+                   logger=None):
+    """ Runs benchmarks against a backend
+
+    Returns:
+        report dict, ready to be serialized as JSON
+    """
+    started = datetime.now(timezone.utc)
+    suites = Suites(backend, rows, quick,
+                    logger or logging.getLogger("benchmarks"))
+    results = suites.run(names)
+    return {
+        "started": started.isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": backend.describe(),
+        "rows": rows,
+        "quick": quick,
+        "results": results
+    }
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks MySQL blocks driver, against a fake "
+                    "server unless a server is given")
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument("--host", help="server to run against")
+    server.add_argument("--mysqld", nargs="?", const="mysqld",
+                        help="start a server from this executable with "
+                             "data in a temporary directory")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="nio_benchmarks",
+                        help="database created and dropped by benchmarks")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="milliseconds fake server adds per statement")
+    parser.add_argument("--rows", type=int, default=20000,
+                        help="rows written or read per measurement")
+    parser.add_argument("--quick", action="store_true",
+                        help="reduce parameter ranges to a minimum")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS,
+                        help="benchmarks to run, all by default")
+    parser.add_argument("--output", help="file results are written to, "
+                                         "standard output by default")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+
+    server = None
+    if args.mysqld:
+        server = TemporaryServer(args.mysqld).start()
+        backend = ServerBackend(server.host, server.port, server.user,
+                                server.password, args.database)
+    elif args.host:
+        backend = ServerBackend(args.host, args.port, args.user,
+                                args.password, args.database)
+    else:
+        backend = FakeBackend(args.latency / 1000.0)
+
+    try:
+        report = run_benchmarks(backend, args.rows, args.quick, args.only)
+    finally:
+        backend.close()
+        if server is not None:
+            server.stop()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
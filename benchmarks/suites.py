@@ -0,0 +1,339 @@
+import tracemalloc
+from itertools import count
+from statistics import median
+from time import monotonic, sleep
+
+
+class Item(object):
+    """ Item stored by benchmarks, attributes become table columns
+    """
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+
+# column values by column position, columns cycle through these types
+COLUMN_VALUES = [
+    lambda index: index,
+    lambda index: index * 0.25,
+    lambda index: "text value {0}".format(index),
+    lambda index: index % 2 == 0
+]
+
+
+def item_table(item):
+    return type(item).__name__
+
+
+def make_items(tables, rows, columns):
+    """ Creates items spread evenly over tables
+
+    Args:
+        tables: names of tables items go to
+        rows: number of items
+        columns: number of attributes per item
+    """
+    classes = [type(table, (Item,), {}) for table in tables]
+    names = ["c{0}".format(column) for column in range(columns)]
+    return [
+        classes[index % len(classes)](**{
+            name: COLUMN_VALUES[position % len(COLUMN_VALUES)](index)
+            for position, name in enumerate(names)
+        })
+        for index in range(rows)
+    ]
+
+
+def result(benchmark, params, rows, seconds, **extra):
+    output = {
+        "benchmark": benchmark,
+        "params": params,
+        "rows": rows,
+        "seconds": round(seconds, 6),
+        "rows_per_second": round(rows / seconds, 1) if seconds else None
+    }
+    output.update(extra)
+    return output
+
+
+class Suites(object):
+    """ Benchmarks run against the driver of a backend
+
+    Every benchmark works on tables of its own, created on first use, so
+    that table creation is kept out of measurements unless measured.
+    """
+
+    INSERT_MODES = {
+        "insert": {},
+        "columnar": {"insert_columnar": True},
+        "bulk_load": {"bulk_load_threshold": 1}
+    }
+
+    def __init__(self, backend, rows=20000, quick=False, logger=None):
+        """ Create suites
+
+        Args:
+            backend: provides drivers and breaks their connections
+            rows: rows written or read per measurement
+            quick: whether parameter ranges are reduced to a minimum
+        """
+        self._backend = backend
+        self._rows = rows
+        self._quick = quick
+        self._logger = logger
+        self._tables = count()
+
+    def run(self, names=None):
+        """ Runs benchmarks
+
+        Args:
+            names: benchmarks to run, all when None
+
+        Returns:
+            list of results
+        """
+        benchmarks = [
+            ("add_items", self.add_items),
+            ("insert_modes", self.insert_modes),
+            ("insert_workers", self.insert_workers),
+            ("schema_evolution", self.schema_evolution),
+            ("query", self.query),
+            ("reconnect", self.reconnect)
+        ]
+        results = []
+        for name, benchmark in benchmarks:
+            if names is None or name in names:
+                results.extend(benchmark())
+        return results
+
+    def add_items(self):
+        """ Measures insert throughput across batch sizes, column counts
+        and number of tables a batch is spread over
+        """
+        batch_sizes = [100] if self._quick else [1, 10, 100, 1000, 10000]
+        column_counts = [4] if self._quick else [4, 16, 64]
+        fan_outs = [1, 4] if self._quick else [1, 4, 16]
+        results = []
+        with self._driver() as db:
+            for batch_size in batch_sizes:
+                for columns in column_counts:
+                    for fan_out in fan_outs:
+                        params = {"batch_size": batch_size,
+                                  "columns": columns, "tables": fan_out}
+                        rows, seconds = self._insert(
+                            db, batch_size, columns, fan_out)
+                        results.append(result("add_items", params, rows,
+                                              seconds))
+        return results
+
+    def insert_modes(self):
+        """ Measures insert throughput of multi-row, columnar and bulk
+        load inserts on large batches
+        """
+        batch_size = 1000 if self._quick else 10000
+        columns = 16
+        results = []
+        for mode, options in self.INSERT_MODES.items():
+            with self._driver(**options) as db:
+                rows, seconds = self._insert(db, batch_size, columns, 1)
+                params = {"mode": mode, "batch_size": batch_size,
+                          "columns": columns}
+                # servers refusing local files make bulk loads fall back
+                results.append(result(
+                    "insert_modes", params, rows, seconds,
+                    bulk_load=db._bulk_load_threshold > 0))
+        return results
+
+    def insert_workers(self):
+        """ Measures insert throughput of batches spread over many tables
+        when tables are inserted into one after another and concurrently
+        """
+        fan_out = 4 if self._quick else 16
+        worker_counts = [1, 4] if self._quick else [1, 4, 16]
+        batch_size = 1000
+        results = []
+        for workers in worker_counts:
+            with self._driver(insert_workers=workers,
+                              pool_max_size=workers) as db:
+                rows, seconds = self._insert(db, batch_size, 16, fan_out)
+                params = {"workers": workers, "tables": fan_out,
+                          "batch_size": batch_size, "columns": 16}
+                results.append(result("insert_workers", params, rows,
+                                      seconds))
+        return results
+
+    def schema_evolution(self):
+        """ Measures the cost of batches bringing new columns, one column
+        per batch and all columns in a single batch, against batches
+        matching their table
+        """
+        new_columns = 4 if self._quick else 32
+        batch_size = 100
+        base_columns = 8
+        results = []
+        with self._driver() as db:
+            for mode in ("unchanged", "column_per_batch", "columns_at_once"):
+                table = self._table_names(1)
+                # create table and its base columns up front
+                self._add_batch(db, make_items(table, batch_size,
+                                               base_columns))
+                if mode == "unchanged":
+                    batches = [make_items(table, batch_size, base_columns)
+                               for _ in range(new_columns)]
+                elif mode == "column_per_batch":
+                    batches = [make_items(table, batch_size, base_columns + 1
+                                          + column)
+                               for column in range(new_columns)]
+                else:
+                    batches = [make_items(table, batch_size,
+                                          base_columns + new_columns)]
+                start = monotonic()
+                for batch in batches:
+                    self._add_batch(db, batch)
+                seconds = monotonic() - start
+                params = {"mode": mode, "new_columns": new_columns,
+                          "base_columns": base_columns,
+                          "batch_size": batch_size}
+                results.append(result(
+                    "schema_evolution", params, batch_size * len(batches),
+                    seconds,
+                    seconds_per_batch=round(seconds / len(batches), 6)))
+        return results
+
+    def query(self):
+        """ Measures query throughput reading a table at once and in
+        chunks, along with peak memory held by results
+        """
+        rows = min(self._rows, 10000) if self._quick else self._rows
+        chunk_sizes = [100] if self._quick else [100, 1000, 10000]
+        results = []
+        with self._driver() as db:
+            table = self._table_names(1)
+            batch_size = 1000
+            for first in range(0, rows, batch_size):
+                self._add_batch(db, make_items(
+                    table, min(batch_size, rows - first), 8))
+            statement = "SELECT * FROM {0}".format(table[0])
+
+            def buffered():
+                result_rows, description = db.execute_statement(
+                    statement, "fetchall")
+                return len(_to_outputs(result_rows, description))
+
+            runs = [("buffered", None, buffered)]
+            for chunk_size in chunk_sizes:
+                def streamed(chunk_size=chunk_size):
+                    return sum(len(_to_outputs(chunk, description))
+                               for chunk, description in
+                               db.stream_statement(statement, chunk_size))
+                runs.append(("streaming", chunk_size, streamed))
+
+            for mode, chunk_size, run in runs:
+                # traced run also warms up statement caches
+                peak_memory = _peak_memory(run)
+                start = monotonic()
+                read = run()
+                seconds = monotonic() - start
+                params = {"mode": mode, "chunk_size": chunk_size,
+                          "columns": 8}
+                results.append(result("query", params, read, seconds,
+                                      peak_memory=peak_memory))
+        return results
+
+    def reconnect(self):
+        """ Measures the time from connections being broken until a batch
+        is written again
+        """
+        repeats = 2 if self._quick else 5
+        timeout = 30
+        batch_size = 100
+        samples = []
+        failures = []
+        with self._driver() as db:
+            table = self._table_names(1)
+            self._add_batch(db, make_items(table, batch_size, 4))
+            for _ in range(repeats):
+                self._backend.break_connections()
+                start = monotonic()
+                failed = 0
+                while True:
+                    try:
+                        self._add_batch(db, make_items(table, batch_size, 4))
+                        break
+                    except Exception:
+                        failed += 1
+                        if monotonic() - start > timeout:
+                            raise
+                        # reconnect as blocks do on connection errors
+                        db.close()
+                        try:
+                            db.open()
+                        except Exception:
+                            sleep(0.01)
+                samples.append(monotonic() - start)
+                failures.append(failed)
+        params = {"repeats": repeats, "batch_size": batch_size}
+        return [result("reconnect", params, batch_size * repeats,
+                       sum(samples),
+                       median_seconds=round(median(samples), 6),
+                       max_seconds=round(max(samples), 6),
+                       failed_attempts=failures)]
+
+    def _insert(self, db, batch_size, columns, fan_out):
+        """ Writes rows in batches to tables created beforehand
+
+        Returns:
+            (rows, seconds) tuple
+        """
+        tables = self._table_names(fan_out)
+        batches = max(1, self._rows // batch_size)
+        # batches are built up front so that only writes are measured
+        items = make_items(tables, batch_size * (batches + 1), columns)
+        self._add_batch(db, items[:batch_size])
+        start = monotonic()
+        for index in range(1, batches + 1):
+            self._add_batch(
+                db, items[index * batch_size:(index + 1) * batch_size])
+        return batch_size * batches, monotonic() - start
+
+    @staticmethod
+    def _add_batch(db, items):
+        db.add_items(items)
+        db.end_batch()
+
+    def _table_names(self, tables):
+        return ["bench_{0}".format(next(self._tables))
+                for _ in range(tables)]
+
+    def _driver(self, **options):
+        return _OpenDriver(self._backend.create_driver(
+            item_table, self._logger, **options))
+
+
+class _OpenDriver(object):
+
+    def __init__(self, db):
+        self._db = db
+
+    def __enter__(self):
+        self._db.open()
+        return self._db
+
+    def __exit__(self, *args):
+        self._db.close()
+
+
+def _to_outputs(rows, description):
+    """ Turns rows into dicts the way query blocks build signals
+    """
+    field_names = [field[0] for field in description]
+    return [dict(zip(field_names, row)) for row in rows]
+
+
+def _peak_memory(run):
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
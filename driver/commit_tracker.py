@@ -0,0 +1,98 @@
+from enum import Enum
+from threading import Lock
+from time import monotonic
+
+
+class CommitPolicy(Enum):
+    statement = "statement"
+    rows = "rows"
+    interval = "interval"
+    batch = "batch"
+    on_close = "on_close"
+
+
+class CommitTracker(object):
+    """ Keeps track of uncommitted work per connection and decides when
+    it has to be committed
+
+    Policies:
+        statement: commit after every statement
+        rows: commit once a connection holds rows_per_commit uncommitted
+            rows
+        interval: commit once a connection held uncommitted work for
+            interval seconds, idle connections are expected to be
+            committed periodically by the caller
+        batch: commit when a batch of work ends
+        on_close: commit when connection is closed
+    """
+
+    def __init__(self, policy=CommitPolicy.on_close, rows_per_commit=1000,
+                 interval=1.0):
+        """ Create a tracker
+
+        Args:
+            policy (CommitPolicy): when work is committed
+            rows_per_commit: rows written before a commit on rows policy
+            interval: seconds work stays uncommitted on interval policy
+        """
+        self._policy = policy
+        self._rows_per_commit = max(1, rows_per_commit)
+        self._interval = interval
+        self._lock = Lock()
+        # (uncommitted rows, time of first uncommitted statement) tuples
+        # by connection id
+        self._pending = {}
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def written(self, connection, rows=0):
+        """ Records a statement executed on a connection
+
+        Args:
+            connection: connection statement was executed on
+            rows: number of rows statement modified
+
+        Returns:
+            True when connection has to be committed now
+        """
+        if self._policy == CommitPolicy.statement:
+            return True
+        with self._lock:
+            pending_rows, since = self._pending.get(
+                id(connection), (0, monotonic()))
+            pending_rows += rows
+            self._pending[id(connection)] = (pending_rows, since)
+        if self._policy == CommitPolicy.rows:
+            return pending_rows >= self._rows_per_commit
+        if self._policy == CommitPolicy.interval:
+            return monotonic() - since >= self._interval
+        return False
+
+    def committed(self, connection):
+        with self._lock:
+            self._pending.pop(id(connection), None)
+
+    def forget(self, connection):
+        """ Drops tracking of a closed connection, its id may be reused
+        by a later connection
+        """
+        self.committed(connection)
+
+    def pending(self, connection):
+        """ Finds out whether a connection holds uncommitted work
+        """
+        if self._policy == CommitPolicy.statement:
+            return False
+        with self._lock:
+            return id(connection) in self._pending
+
+    @property
+    def uncommitted_rows(self):
+        with self._lock:
+            return sum(rows for rows, _ in self._pending.values())
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
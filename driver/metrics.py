@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+
+
+class LatencyHistogram(object):
+    """ Latency distribution kept in exponentially sized buckets
+
+    Bucket upper bounds double from 50 microseconds up to about 100
+    seconds, percentiles are estimated as the upper bound of the bucket
+    holding them, capped by the largest latency seen.
+    """
+
+    BOUNDS = [0.05 * 2 ** exponent for exponent in range(22)]
+
+    def __init__(self):
+        self._buckets = [0] * (len(self.BOUNDS) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    def observe(self, milliseconds):
+        self._buckets[bisect_left(self.BOUNDS, milliseconds)] += 1
+        self._count += 1
+        self._sum += milliseconds
+        if self._min is None or milliseconds < self._min:
+            self._min = milliseconds
+        if self._max is None or milliseconds > self._max:
+            self._max = milliseconds
+
+    def percentile(self, percent):
+        if not self._count:
+            return None
+        rank = self._count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.BOUNDS):
+                    return min(self.BOUNDS[index], self._max)
+                break
+        return self._max
+
+    def summary(self):
+        """ Provides count, total, mean, min, max and percentiles, times
+        are in milliseconds
+        """
+        return {
+            "count": self._count,
+            "total": round(self._sum, 3),
+            "mean": _round(self._sum / self._count if self._count else None),
+            "min": _round(self._min),
+            "max": _round(self._max),
+            "p50": _round(self.percentile(50)),
+            "p95": _round(self.percentile(95)),
+            "p99": _round(self.percentile(99))
+        }
+
+
+def _round(milliseconds):
+    return None if milliseconds is None else round(milliseconds, 3)
+
+
+class Metrics(object):
+    """ Thread safe counters and latency histograms
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._started = monotonic()
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """ Records a duration
+
+        Args:
+            name: histogram name
+            seconds: duration in seconds
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds * 1000)
+
+    @contextmanager
+    def timer(self, name):
+        """ Records the duration of a with block, including failed ones
+        """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - start)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """ Provides counters, their rate per second and latency summaries
+        since metrics were created or last reset
+        """
+        with self._lock:
+            elapsed = monotonic() - self._started
+            return {
+                "elapsed": round(elapsed, 3),
+                "counters": dict(self._counters),
+                "rates": {
+                    name: round(value / elapsed, 3) if elapsed else None
+                    for name, value in self._counters.items()
+                },
+                "latency": {
+                    name: histogram.summary()
+                    for name, histogram in self._histograms.items()
+                }
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self._started = monotonic()
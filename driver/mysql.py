@@ -1,63 +1,213 @@
 import datetime
-from .sql import SQL
+import json
+import math
+import os
+from collections import defaultdict
+from threading import Thread
+
+from .schema import PartitionInterval
+from .sql import SQL, ConflictMode
+
+try:
+    # faster JSON encoder, used when available
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(value):
+    """ Encodes values the JSON encoder does not know about, datetimes
+    are encoded the same way with or without orjson
+    """
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps_json(value):
+    """ Provides the compact JSON text of a value
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default,
+                            option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False,
+                      default=_json_default)
 
 
 class MySQL(SQL):
     """ Overrides methods to provide a MySQL implementation complementing
     SQL parent class.
     """
+
+    # server errors revealing that cached table definitions are stale:
+    # ER_BAD_FIELD_ERROR, ER_DUP_FIELDNAME, ER_NO_SUCH_TABLE
+    SCHEMA_ERROR_CODES = (1054, 1060, 1146)
+    # client errors meaning a connection is gone: CR_SERVER_GONE_ERROR,
+    # CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED
+    CONNECTION_ERROR_CODES = (2006, 2013, 2055)
+    # errors rejecting ALGORITHM=INSTANT: ER_UNKNOWN_ALTER_ALGORITHM,
+    # ER_ALTER_OPERATION_NOT_SUPPORTED,
+    # ER_ALTER_OPERATION_NOT_SUPPORTED_REASON, ER_INNODB_MAX_ROW_VERSION
+    UNKNOWN_ALTER_ALGORITHM_CODE = 1800
+    ALTER_ALGORITHM_ERROR_CODES = (1800, 1845, 1846, 4092)
+    # typecodes of arrays holding column values on columnar inserts
+    ARRAY_TYPECODES = {int: "q", float: "d", bool: "b"}
+    # errors rejecting LOAD DATA LOCAL INFILE: ER_NOT_ALLOWED_COMMAND,
+    # ER_CLIENT_LOCAL_FILES_DISABLED, CR_LOAD_DATA_LOCAL_INFILE_REJECTED
+    BULK_LOAD_REJECTED_CODES = (1148, 3948, 2068)
+    # escaping of text values in LOAD DATA default format, fields are
+    # separated by tabs and rows by new lines
+    LOAD_DATA_ESCAPES = str.maketrans({
+        "\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r",
+        "\0": "\\0"})
+    # LOAD DATA handling of rows conflicting with existing rows
+    LOAD_DATA_CONFLICT_KEYWORDS = {ConflictMode.ignore: "IGNORE ",
+                                   ConflictMode.replace: "REPLACE "}
+    # savepoint a bulk load is rolled back to when it produces warnings
+    BULK_LOAD_SAVEPOINT = "nio_bulk_load"
+    # directory exposing open file descriptors as files
+    FD_DIRECTORY = "/dev/fd"
+    # python types column values are converted to by column data type,
+    # BOOLEAN columns are TINYINT(1) and keep their values as integers,
+    # values of JSON columns are converted to JSON documents
+    PYTHON_TYPES = {
+        "tinyint": int, "smallint": int, "mediumint": int, "int": int,
+        "integer": int, "bigint": int, "year": int,
+        "float": float, "double": float, "real": float,
+        "datetime": datetime.datetime, "timestamp": datetime.datetime,
+        "char": str, "varchar": str, "tinytext": str, "text": str,
+        "mediumtext": str, "longtext": str, "enum": str, "set": str,
+        "json": dict,
+        "binary": bytes, "varbinary": bytes, "tinyblob": bytes,
+        "blob": bytes, "mediumblob": bytes, "longblob": bytes
+    }
+    # largest value a BLOB column holds, larger values get LONGBLOB columns
+    BLOB_MAX_SIZE = 65535
+
     def __init__(self, host, port,
                  database, user, password,
-                 commit_after_query, logger, target_table=None):
+                 commit_after_query, logger, target_table=None,
+                 **kwargs):
         super().__init__(database,
                          commit_after_query,
                          logger,
-                         target_table)
+                         target_table,
+                         **kwargs)
         self._host = host
         self._port = port
         self._user = user
         self._password = password
+        # the client only sends local files when asked to
+        self._local_infile = self._bulk_load_threshold > 0
 
     def get_field_format(self):
         return "%s"
 
-    def parse_field_names(self, fields_in):
-        """ Obtain field names from a fields retrieval query
-
-        Args:
-            fields_in: list of tuples containing field definitions
-        """
-        fields_names = []
-        for field_tuple in fields_in:
-            list_fields = list(field_tuple)
-            fields_names.append(list_fields[0].replace("`", ""))
-        return fields_names
-
-    def get_fields_statement(self, table):
-        return "SHOW COLUMNS FROM {0};".format(table)
-
     def get_table_names(self):
         return "SELECT table_name FROM information_schema.tables " \
                "WHERE table_schema='{0}'".format(self._database)
 
-    def get_table_exists_statement(self, table):
-        return "SELECT COUNT(*) FROM information_schema.tables " \
-               "WHERE table_schema='{0}' AND table_name='{1}'".\
-            format(self._database, table)
+    def get_columns_statement(self, tables):
+        return "SELECT table_name, column_name, data_type " \
+               "FROM information_schema.columns " \
+               "WHERE table_schema=%s AND table_name IN ({0}) " \
+               "ORDER BY table_name, ordinal_position".format(
+                   ",".join(["%s"] * len(tables))), \
+            [self._database] + list(tables)
 
-    def get_type(self, primitive_type):
+    def parse_columns(self, columns_rows):
+        table_fields = defaultdict(list)
+        for table, column, data_type in columns_rows:
+            table_fields[table].append(
+                SQL.FieldItem(column, self.get_python_type(data_type)))
+        return table_fields
+
+    def get_python_type(self, data_type):
+        """ Provides the python type values of a column data type are
+        converted to, None when conversion is to be guessed from values
+        """
+        if isinstance(data_type, bytes):
+            # some server versions report information_schema as binary
+            data_type = data_type.decode()
+        return MySQL.PYTHON_TYPES.get(data_type.lower())
+
+    def get_type(self, primitive_type, value=None):
         type_out = "TEXT"
         if primitive_type == int:
-            type_out = "INTEGER"
+            # values later stored in a column may outgrow its first ones
+            type_out = "BIGINT"
         elif primitive_type == bool:
             type_out = "BOOLEAN"
         elif primitive_type == datetime.datetime:
-            type_out = "DATETIME"
+            # keep microseconds
+            type_out = "DATETIME(6)"
         elif primitive_type == float:
-            type_out = "FLOAT"
+            type_out = "DOUBLE"
+        elif primitive_type in (dict, list, tuple):
+            type_out = "JSON"
+        elif primitive_type in (bytes, bytearray):
+            type_out = "BLOB"
+            if value is not None and len(value) > MySQL.BLOB_MAX_SIZE:
+                type_out = "LONGBLOB"
+
+        return type_out
 
+    def get_key_type(self, primitive_type, value=None):
+        # TEXT and BLOB columns cannot be part of a unique key without a
+        # prefix
+        type_out = self.get_type(primitive_type, value)
+        if type_out == "TEXT":
+            return "VARCHAR(255)"
+        elif type_out.endswith("BLOB"):
+            return "VARBINARY(255)"
         return type_out
 
+    def get_auto_id_type(self):
+        return "BIGINT NOT NULL AUTO_INCREMENT"
+
+    def get_partition_clause(self, column, interval, partitions):
+        start = datetime.date.today().replace(day=1) \
+            if interval == PartitionInterval.month else datetime.date.today()
+        definitions = []
+        for _ in range(partitions):
+            end = self._next_period(start, interval)
+            definitions.append(
+                "PARTITION p{0:%Y%m%d} VALUES LESS THAN "
+                "(TO_DAYS('{1:%Y-%m-%d}'))".format(start, end))
+            start = end
+        # rows past created partitions are still accepted
+        definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        return "PARTITION BY RANGE (TO_DAYS(`{0}`)) ({1})".format(
+            column, ",".join(definitions))
+
+    @staticmethod
+    def _next_period(start, interval):
+        if interval == PartitionInterval.day:
+            return start + datetime.timedelta(days=1)
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+
+    def get_insert_clauses(self, table, field_names, update_names):
+        verb = "INSERT"
+        suffix = ""
+        if self._conflict_mode == ConflictMode.ignore:
+            verb = "INSERT IGNORE"
+        elif self._conflict_mode == ConflictMode.replace:
+            verb = "REPLACE"
+        elif self._conflict_mode == ConflictMode.update:
+            if update_names:
+                # VALUES() refers to the row that failed to be inserted,
+                # row aliases are not supported by MariaDB
+                suffix = " ON DUPLICATE KEY UPDATE " + ",".join(
+                    "`{0}`=VALUES(`{0}`)".format(name)
+                    for name in update_names)
+            else:
+                # nothing to update, existing rows are kept as they are
+                verb = "INSERT IGNORE"
+        return "{0} INTO {1} ({2}) VALUES ".format(
+            verb, table, field_names), suffix
+
     def get_value(self, value, type_in):
         if type_in == int:
             value = int(value)
@@ -65,8 +215,13 @@ class MySQL(SQL):
             value = bool(value)
         elif type_in == float:
             value = float(value)
-        elif type_in == list:
-            value = "'{0}'".format(tuple(value))
+        elif type_in in (dict, list, tuple):
+            value = dumps_json(value)
+        elif type_in in (bytes, bytearray):
+            value = self._to_bytes(value)
+        elif isinstance(value, (dict, list, tuple)):
+            # documents stored in other columns are JSON text too
+            value = dumps_json(value)
         elif type_in == datetime.datetime:
             # let datetime values pass through
             pass
@@ -75,29 +230,235 @@ class MySQL(SQL):
 
         return value
 
+    def get_converter(self, type_in):
+        # same conversions as get_value, resolved once per column
+        if type_in in (int, bool, float):
+            return type_in
+        elif type_in in (dict, list, tuple):
+            # text is stored as a JSON string in JSON columns
+            return dumps_json
+        elif type_in in (bytes, bytearray):
+            return self._to_bytes
+        elif type_in == datetime.datetime:
+            return self._to_datetime
+        return self._to_text
+
+    @staticmethod
+    def _to_bytes(value):
+        if type(value) is bytes:
+            return value
+        if isinstance(value, bytearray):
+            return bytes(value)
+        return str(value).encode()
+
+    @staticmethod
+    def _to_datetime(value):
+        if isinstance(value, (dict, list, tuple)):
+            return dumps_json(value)
+        return value
+
+    @staticmethod
+    def _to_text(value):
+        if type(value) is str:
+            return value
+        if isinstance(value, (dict, list, tuple)):
+            return dumps_json(value)
+        return str(value)
+
+    def get_streaming_cursor(self, connection):
+        import pymysql.cursors
+        return connection.cursor(pymysql.cursors.SSCursor)
+
+    def escape_row(self, connection, values):
+        return "({0})".format(
+            ",".join([connection.escape(value) for value in values]))
+
+    def escape_value(self, connection, value):
+        return connection.escape(value)
+
+    def bulk_load(self, cursor, table, field_names, rows):
+        """ Streams rows to LOAD DATA LOCAL INFILE through a pipe
+
+        The client reads the file named in the statement, naming the read
+        end of a pipe fed by a writer thread lets rows go to the server
+        as they are formatted without a temporary file.
+
+        LOAD DATA LOCAL skips rows conflicting on keys and truncates
+        invalid values with warnings only. When conflicts are errors, a
+        load producing warnings is rolled back and rows are left to
+        INSERT statements, which report them.
+        """
+        if not os.path.isdir(MySQL.FD_DIRECTORY):
+            return None
+
+        check_warnings = self._conflict_mode == ConflictMode.error
+        if check_warnings:
+            cursor.execute("SAVEPOINT {0}".format(MySQL.BULK_LOAD_SAVEPOINT))
+        read_fd, write_fd = os.pipe()
+        errors = []
+        writer = Thread(target=self._write_load_data,
+                        args=(write_fd, rows, errors),
+                        name="mysql-bulk-load", daemon=True)
+        writer.start()
+        try:
+            loaded = cursor.execute(
+                "LOAD DATA LOCAL INFILE '{0}/{1}' {2}INTO TABLE {3} "
+                "CHARACTER SET utf8 ({4})".format(
+                    MySQL.FD_DIRECTORY, read_fd,
+                    MySQL.LOAD_DATA_CONFLICT_KEYWORDS.get(
+                        self._conflict_mode, ""), table, field_names))
+        finally:
+            # a writer still blocked on the pipe gets a broken pipe
+            os.close(read_fd)
+            writer.join()
+        if errors:
+            raise errors[0]
+        if check_warnings:
+            warnings = self._get_warning_count(cursor)
+            if warnings:
+                cursor.execute("ROLLBACK TO SAVEPOINT {0}".format(
+                    MySQL.BULK_LOAD_SAVEPOINT))
+                self._logger.warning(
+                    'Bulk load into {0} produced {1} warnings, rolled back '
+                    'to insert rows instead'.format(table, warnings))
+                return None
+            cursor.execute("RELEASE SAVEPOINT {0}".format(
+                MySQL.BULK_LOAD_SAVEPOINT))
+        return loaded
+
+    @staticmethod
+    def _get_warning_count(cursor):
+        """ Provides the number of warnings of the last statement
+        """
+        # pymysql only exposes the count on cursors from 1.1 on, results
+        # hold it in earlier versions
+        result = getattr(cursor, "_result", None)
+        if result is not None:
+            return result.warning_count
+        cursor.execute("SHOW COUNT(*) WARNINGS")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _write_load_data(self, write_fd, rows, errors):
+        try:
+            with open(write_fd, "wb", buffering=65536) as stream:
+                for values in rows:
+                    stream.write("\t".join(
+                        [self.format_load_value(value) for value in values]
+                    ).encode() + b"\n")
+        except BrokenPipeError:
+            # load was interrupted, its outcome is reported by the load
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    def format_load_value(self, value):
+        """ Provides the LOAD DATA representation of a converted value
+        """
+        if value is None:
+            return "\\N"
+        elif isinstance(value, bool):
+            return "1" if value else "0"
+        elif isinstance(value, int):
+            return str(value)
+        elif isinstance(value, float):
+            from pymysql.converters import escape_float
+            return escape_float(value)
+        elif isinstance(value, datetime.datetime):
+            if value.microsecond:
+                return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value).translate(MySQL.LOAD_DATA_ESCAPES)
+
+    def is_bulk_load_rejected_error(self, exception):
+        return self._get_error_code(exception) in \
+            MySQL.BULK_LOAD_REJECTED_CODES
+
+    def can_bulk_load(self, field_item_list):
+        # loaded text is decoded, binary values are inserted instead
+        return not any(field_item.type in (bytes, bytearray)
+                       for field_item in field_item_list)
+
+    def get_array_typecode(self, type_in):
+        return MySQL.ARRAY_TYPECODES.get(type_in)
+
+    def escape_array(self, column):
+        if column.typecode == "d":
+            if not all(map(math.isfinite, column)):
+                # let escaping report values MySQL cannot store
+                from pymysql.converters import escape_float
+                return map(escape_float, column)
+            return map(repr, column)
+        # integers, booleans are held as integers
+        return map(str, column)
+
+    def get_max_statement_size(self):
+        (max_allowed_packet,), _ = self.execute_fetch_one_statement(
+            "SELECT @@max_allowed_packet")
+        # leave room for the packet header and command byte
+        return int(max_allowed_packet) - 1024
+
+    def get_instant_alter_clause(self):
+        return ", ALGORITHM=INSTANT"
+
+    def is_alter_algorithm_error(self, exception):
+        return self._get_error_code(exception) in \
+            MySQL.ALTER_ALGORITHM_ERROR_CODES
+
+    def is_unknown_alter_algorithm_error(self, exception):
+        return self._get_error_code(exception) == \
+            MySQL.UNKNOWN_ALTER_ALGORITHM_CODE
+
+    def is_schema_error(self, exception):
+        import pymysql
+        return isinstance(exception, pymysql.err.MySQLError) and \
+            bool(exception.args) and \
+            exception.args[0] in MySQL.SCHEMA_ERROR_CODES
+
+    def is_connection_error(self, exception):
+        import pymysql
+        if isinstance(exception, pymysql.err.InterfaceError):
+            return True
+        return isinstance(exception, pymysql.err.OperationalError) and \
+            bool(exception.args) and \
+            exception.args[0] in MySQL.CONNECTION_ERROR_CODES
+
+    def check_connection(self, connection):
+        connection.ping(reconnect=False)
+
+    @staticmethod
+    def _get_error_code(exception):
+        import pymysql
+        if isinstance(exception, pymysql.err.MySQLError) and exception.args:
+            return exception.args[0]
+
     def setup_connection(self):
         import pymysql
         try:
-            self.connection = pymysql.connect(host=self._host,
-                                              port=self._port,
-                                              user=self._user,
-                                              passwd=self._password,
-                                              db=self._database,
-                                              charset='utf8')
+            connection = pymysql.connect(host=self._host,
+                                         port=self._port,
+                                         user=self._user,
+                                         passwd=self._password,
+                                         db=self._database,
+                                         charset='utf8',
+                                         local_infile=self._local_infile)
         except Exception as e:
             self._logger.warning(
                 'Trying to open database: {0}, details: {1}'.
                 format(self._database, str(e)))
             # attempt to create the database
-            self.connection = pymysql.connect(host=self._host,
-                                              port=self._port,
-                                              user=self._user,
-                                              passwd=self._password)
-            cursor = self.connection.cursor()
+            connection = pymysql.connect(host=self._host,
+                                         port=self._port,
+                                         user=self._user,
+                                         passwd=self._password,
+                                         local_infile=self._local_infile)
+            cursor = connection.cursor()
             statement = "CREATE DATABASE IF NOT EXISTS `{0}`".format(
                 self._database)
             cursor.execute(statement)
             cursor.close()
 
             # now attempt to select database
-            self.connection.select_db(self._database)
+            connection.select_db(self._database)
+
+        return connection
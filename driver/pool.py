@@ -0,0 +1,265 @@
+from contextlib import contextmanager
+from threading import Condition
+from time import monotonic
+
+
+class PoolTimeout(Exception):
+    """ Raised when no pooled connection becomes available in time
+    """
+    pass
+
+
+class ConnectionPool(object):
+    """ A bounded pool of database connections
+
+    Connections are created on demand by the factory up to max_size,
+    connections idle for longer than idle_timeout are closed as long as
+    the pool holds more than min_size connections, and connections that
+    sat idle for a while are validated before being handed out.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=1,
+                 checkout_timeout=None, idle_timeout=None,
+                 validate=None, is_broken=None, validate_after=1.0,
+                 before_close=None, after_close=None, logger=None):
+        """ Create a pool
+
+        Args:
+            factory: callable returning a new connection
+            min_size: connections to open upfront and keep when idle
+            max_size: maximum number of connections
+            checkout_timeout: seconds to wait for a connection, None
+                waits forever
+            idle_timeout: seconds a connection can stay idle before being
+                closed, None keeps idle connections forever
+            validate: callable raising when a connection is not usable
+            is_broken: callable receiving an exception raised while a
+                connection was in use, returns True when the connection
+                should be discarded
+            validate_after: seconds a connection has to be idle before it
+                is validated on checkout
+            before_close: callable receiving a usable connection about to
+                be closed, such as an evicted idle connection, pending
+                work can be saved there
+            after_close: callable receiving every connection closed by
+                the pool, usable or not
+            logger: logger instance
+        """
+        if max_size < 1:
+            raise ValueError("Pool max size has to be at least 1")
+        self._factory = factory
+        self._min_size = max(0, min(min_size, max_size))
+        self._max_size = max_size
+        self._checkout_timeout = checkout_timeout
+        self._idle_timeout = idle_timeout
+        self._validate = validate
+        self._is_broken = is_broken
+        self._validate_after = validate_after
+        self._before_close = before_close
+        self._after_close = after_close
+        self._logger = logger
+
+        self._condition = Condition()
+        # idle connections as (connection, last used time) tuples
+        self._idle = []
+        self._size = 0
+        self._closed = False
+
+    def open(self):
+        """ Opens min_size connections upfront
+        """
+        connections = [self.checkout() for _ in range(self._min_size)]
+        for connection in connections:
+            self.checkin(connection)
+
+    def close(self):
+        """ Closes idle connections, connections in use are closed
+        when checked in
+        """
+        with self._condition:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+
+    @contextmanager
+    def connection(self):
+        """ Provides a pooled connection for the duration of a with block
+        """
+        connection = self.checkout()
+        discard = False
+        try:
+            yield connection
+        except Exception as e:
+            discard = bool(self._is_broken and self._is_broken(e))
+            raise
+        finally:
+            # also reached when a generator holding the connection is
+            # closed before being exhausted
+            self.checkin(connection, discard)
+
+    def checkout(self):
+        """ Takes a connection from the pool, creating one if needed
+
+        Raises:
+            PoolTimeout: if no connection became available in time
+        """
+        deadline = None if self._checkout_timeout is None else \
+            monotonic() + self._checkout_timeout
+        while True:
+            with self._condition:
+                connection, last_used = self._wait_for_slot(deadline)
+
+            if connection is None:
+                try:
+                    return self._factory()
+                except:
+                    self._release_slot()
+                    raise
+
+            if self._validate is None or \
+                    monotonic() - last_used < self._validate_after:
+                return connection
+            try:
+                self._validate(connection)
+                return connection
+            except Exception as e:
+                if self._logger:
+                    self._logger.warning(
+                        'Discarding pooled connection, details: {0}'.
+                        format(str(e)))
+                self._close(connection, usable=False)
+                self._release_slot()
+
+    def checkin(self, connection, discard=False):
+        """ Returns a connection to the pool
+
+        Args:
+            connection: connection obtained through checkout
+            discard: when True the connection is closed instead of reused
+        """
+        with self._condition:
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((connection, monotonic()))
+                connection = None
+            expired = self._evict_idle()
+            self._condition.notify()
+        if connection is not None:
+            self._close(connection, usable=not discard)
+        for expired_connection in expired:
+            self._close(expired_connection)
+
+    def each_idle(self, callback):
+        """ Invokes callback on every idle connection
+
+        Idle connections are taken out of the pool while the callback
+        runs so that no other thread uses them concurrently.
+        """
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+        try:
+            for connection, _ in idle:
+                callback(connection)
+        finally:
+            with self._condition:
+                if self._closed:
+                    self._size -= len(idle)
+                else:
+                    self._idle.extend(idle)
+                    idle = []
+                self._condition.notify_all()
+            for connection, _ in idle:
+                self._close(connection)
+
+    @property
+    def size(self):
+        """ Number of connections held, both idle and in use
+        """
+        with self._condition:
+            return self._size
+
+    @property
+    def idle_count(self):
+        with self._condition:
+            return len(self._idle)
+
+    def _wait_for_slot(self, deadline):
+        """ Waits until an idle connection or room for a new one exists,
+        must be called holding the condition
+
+        Returns:
+            (connection, last used) tuple, connection is None when the
+            caller has to create a new connection
+        """
+        while True:
+            if self._closed:
+                raise RuntimeError("Pool is closed")
+            if self._idle:
+                # most recently used connection is the most likely alive
+                return self._idle.pop()
+            if self._size < self._max_size:
+                self._size += 1
+                return None, None
+
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                raise PoolTimeout(
+                    "Timed out after {0} seconds waiting for a free pool "
+                    "slot".format(self._checkout_timeout))
+            self._condition.wait(remaining)
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _evict_idle(self):
+        """ Removes connections idle for longer than idle_timeout, must be
+        called holding the condition
+
+        Returns:
+            list of connections to close
+        """
+        if self._idle_timeout is None:
+            return []
+        expired = []
+        oldest_allowed = monotonic() - self._idle_timeout
+        # idle list is ordered by last use, oldest first
+        while self._idle and self._size > self._min_size and \
+                self._idle[0][1] < oldest_allowed:
+            connection, _ = self._idle.pop(0)
+            self._size -= 1
+            expired.append(connection)
+        return expired
+
+    def _close(self, connection, usable=True):
+        """ Closes a connection leaving the pool
+
+        Args:
+            connection: connection to close
+            usable: False when the connection is broken, before close
+                callback is not invoked then
+        """
+        if usable and self._before_close is not None:
+            try:
+                self._before_close(connection)
+            except Exception as e:
+                if self._logger:
+                    self._logger.warning(
+                        'Failed to prepare pooled connection for closing, '
+                        'details: {0}'.format(str(e)))
+        try:
+            connection.close()
+        except Exception as e:
+            if self._logger:
+                self._logger.debug(
+                    'Failed to close pooled connection, details: {0}'.
+                    format(str(e)))
+        if self._after_close is not None:
+            self._after_close(connection)
@@ -0,0 +1,53 @@
+from enum import Enum
+
+
+class PartitionInterval(Enum):
+    day = "day"
+    month = "month"
+
+
+class SchemaHints(object):
+    """ Declarative hints applied to tables when they are created
+
+    Columns named in hints but missing from the items creating a table
+    are left out, along with any key or index referencing them.
+    """
+
+    def __init__(self, id_column=None, primary_key=None, indexes=None,
+                 varchar_columns=None, partition_column=None,
+                 partition_interval=PartitionInterval.month, partitions=12):
+        """ Create hints
+
+        Args:
+            id_column: name of an auto-increment id column added to
+                tables, primary key when no primary key is given
+            primary_key: columns forming the primary key
+            indexes: list of column lists, one secondary index each
+            varchar_columns: VARCHAR lengths by column name, columns
+                are otherwise typed after their values
+            partition_column: datetime column tables are partitioned by
+                range on
+            partition_interval (PartitionInterval): time span of each
+                partition
+            partitions: number of partitions created ahead, starting with
+                current interval, later rows go to a catch-all partition
+        """
+        self.id_column = id_column or None
+        self.primary_key = list(primary_key or [])
+        self.indexes = [list(index) for index in indexes or [] if index]
+        self.varchar_columns = {
+            column.lower(): length
+            for column, length in (varchar_columns or {}).items()}
+        self.partition_column = partition_column or None
+        self.partition_interval = partition_interval
+        self.partitions = max(1, partitions)
+
+    def indexed_columns(self):
+        """ Provides lower case names of columns part of a key or index
+        """
+        columns = set(self.primary_key)
+        for index in self.indexes:
+            columns.update(index)
+        if self.partition_column:
+            columns.add(self.partition_column)
+        return {column.lower() for column in columns}
@@ -1,27 +1,122 @@
-from collections import defaultdict
+import datetime
+import re
+from array import array
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from enum import Enum
+from itertools import count
 from threading import RLock
+from time import monotonic
+
+from .commit_tracker import CommitPolicy, CommitTracker
+from .metrics import Metrics
+from .pool import ConnectionPool
+from .schema import SchemaHints
+
+
+class ConflictMode(Enum):
+    error = "error"
+    ignore = "ignore"
+    replace = "replace"
+    update = "update"
 
 
 class SQL(object):
 
-    # TODO: this LUT substitution helper could come from configuration/setting
+    # default table names replacing table names resulting from items
     TABLE_NAME_TRANSLATIONS = {'Signal': 'NIOSignal'}
 
+    # statements starting with these keywords produce a result set
+    ROW_STATEMENTS = ("SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN",
+                      "WITH", "VALUES", "TABLE", "CALL")
+    STATEMENT_KEYWORD = re.compile(r"[\s(]*(\w+)")
+    # maximum number of parameterized statement templates kept
+    TEMPLATES_CACHE_SIZE = 256
+    # items turned into columns at once on columnar inserts when the
+    # number of rows per insert is not limited
+    COLUMNAR_SLICE_SIZE = 1000
+
     class FieldItem(object):
 
         def __init__(self, name, type_in):
             self.name = name
             self.type = type_in
 
-    def __init__(self, database, commit_after_query, logger, target_table):
+    def __init__(self, database, commit_after_query, logger, target_table,
+                 pool_min_size=1, pool_max_size=1,
+                 pool_checkout_timeout=None, pool_idle_timeout=None,
+                 insert_max_rows=1000, insert_max_bytes=1048576,
+                 preload_tables=None, insert_columnar=False,
+                 bulk_load_threshold=0, commit_policy=None,
+                 commit_rows=1000, commit_interval=1.0,
+                 slow_statement_threshold=None, slow_statement_sample=1,
+                 slow_statement_max_length=200, insert_workers=1,
+                 table_name_translations=None,
+                 conflict_mode=ConflictMode.error, key_columns=None,
+                 update_columns=None, schema_hints=None):
         super().__init__()
         self._database = database
-        self._commit_after_query = commit_after_query
+        if commit_policy is None:
+            # commit_after_query flag predates commit policies
+            commit_policy = CommitPolicy.statement if commit_after_query \
+                else CommitPolicy.on_close
+        self._commit_tracker = CommitTracker(commit_policy, commit_rows,
+                                             commit_interval)
         self._logger = logger
+        # table name, or callable evaluating table name for each item
         self._target_table = target_table
+        # table names replacing resulting table names
+        self._table_name_translations = dict(
+            SQL.TABLE_NAME_TRANSLATIONS if table_name_translations is None
+            else table_name_translations)
+        self._pool_min_size = pool_min_size
+        self._pool_max_size = pool_max_size
+        self._pool_checkout_timeout = pool_checkout_timeout
+        self._pool_idle_timeout = pool_idle_timeout
+        # limits applied when splitting inserts into multi-row statements
+        self._insert_max_rows = insert_max_rows
+        self._insert_max_bytes = insert_max_bytes
+        # whether insert rows are built column by column from typed arrays
+        self._insert_columnar = insert_columnar
+        # batches of at least this many items per table are bulk loaded,
+        # 0 disables bulk loads
+        self._bulk_load_threshold = bulk_load_threshold
+        # what happens to inserted rows conflicting with existing rows,
+        # tables created by the driver get a unique key over key columns,
+        # conflicting rows update update columns, all non key columns
+        # when none are given
+        self._conflict_mode = conflict_mode
+        self._key_columns = list(key_columns or [])
+        self._update_columns = list(update_columns or [])
+        # keys, indexes, column types and partitioning of created tables
+        self._schema_hints = schema_hints or SchemaHints()
+        self._max_statement_size = None
+        # whether new columns can be added without rebuilding tables
+        self._instant_alter = True
+        # tables whose definitions are loaded at connect time, any other
+        # table definitions are loaded the first time a table is targeted
+        self._preload_tables = preload_tables or []
 
         self._connection = None
         self._connection_lock = RLock()
+        # counters and latencies of database operations
+        self._metrics = Metrics()
+        # statements taking at least this many seconds are logged, one
+        # out of every sample, with statement and values truncated
+        self._slow_statement_threshold = slow_statement_threshold
+        self._slow_statement_sample = max(1, slow_statement_sample)
+        self._slow_statement_max_length = slow_statement_max_length
+        self._slow_statements = count()
+        # runs statements concurrently over pooled connections
+        self._executor = None
+        # number of tables of a batch inserted into concurrently, each
+        # over a pooled connection of its own
+        self._insert_workers = max(1, insert_workers)
+        self._insert_executor = None
+        # caches per statement template whether it produces a result set
+        self._templates = OrderedDict()
+        self._templates_lock = RLock()
         # caches field definitions for each table in the database
         self._tables = defaultdict(dict)
         self._tables_lock = RLock()
@@ -29,12 +124,29 @@ class SQL(object):
     def open(self):
         """ Initiates a database connection
         """
-        with self._connection_lock:
-            self.setup_connection()
-        table_names, _ = \
-            self.execute_fetch_all_statement(self.get_table_names())
-        for table_name, in table_names:
-            self._update_field_definitions(table_name)
+        with self._connection_locked():
+            pool = ConnectionPool(self._open_connection,
+                                  self._pool_min_size,
+                                  self._pool_max_size,
+                                  self._pool_checkout_timeout,
+                                  self._pool_idle_timeout,
+                                  validate=self.check_connection,
+                                  is_broken=self.is_connection_error,
+                                  before_close=self._commit_pending,
+                                  after_close=self._commit_tracker.forget,
+                                  logger=self._logger)
+            pool.open()
+            self.connection = pool
+            if self._pool_max_size > 1 and self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._pool_max_size)
+            insert_workers = min(self._insert_workers, self._pool_max_size)
+            if insert_workers > 1 and self._insert_executor is None:
+                self._insert_executor = ThreadPoolExecutor(
+                    max_workers=insert_workers)
+        self._max_statement_size = self.get_max_statement_size()
+        if self._preload_tables:
+            self._load_tables(self._preload_tables)
 
     def close(self):
         """ Terminates a database connection
@@ -43,14 +155,22 @@ class SQL(object):
         # commit any unsaved changes if any
         self.commit()
         if self.connected:
-            with self._connection_lock:
+            with self._connection_locked():
                 try:
                     self.connection.close()
                 except:
                     self._logger.exception('Could not close database: {0}'.
                                            format(self._database))
                 finally:
+                    # connections still in use are committed and
+                    # forgotten when checked in
                     self.connection = None
+                    if self._executor is not None:
+                        self._executor.shutdown(wait=False)
+                        self._executor = None
+                    if self._insert_executor is not None:
+                        self._insert_executor.shutdown(wait=False)
+                        self._insert_executor = None
 
     def delete_table(self, table):
         self.execute_statement("DROP TABLE IF EXISTS `{0}`".format(table))
@@ -66,55 +186,17 @@ class SQL(object):
 
         processed_items = 0
         if self.connected:
+            # determine for each table, the items that will be inserted to it
+            item_tables = self._route_items(items)
+
             # each item can potentially add columns to a table,
             # make sure potential new table structure can store item
-            self._adjust_tables_structure(items, False)
-
-            # determine for each table, the values that will be inserted to it
-            value_tables = defaultdict(list)
-            for e in items:
-                table_name = self.get_table_name(e)
-                with self._tables_lock:
-                    if table_name in self._tables:
-                        processed_items += 1
-
-                        # add item
-                        value_tables[table_name].append(
-                            self._get_values(
-                                e,
-                                self._tables[table_name]["field_item_list"]))
+            with self._metrics.timer("schema_check"):
+                self._adjust_tables_structure(item_tables, False)
 
             # execute actual insert queries per table
-            for table in value_tables:
-                items_count = len(value_tables[table])
-                if items_count:
-                    with self._tables_lock:
-                        statement = "INSERT INTO {0} ({1}) VALUES ({2});".\
-                            format(table,
-                                   self._tables[table]["field_names"],
-                                   self._tables[table]["field_formats"])
-
-                    with self._connection_lock:
-                        cursor = self.connection.cursor()
-                        # convert item values to tuple and insert
-                        values = tuple(value_tables[table])
-                        try:
-                            cursor.executemany(statement, values)
-
-                            self._logger.debug(
-                                'Inserted: {0} into: {1}, statement: {2}, '
-                                'values:{3}'.format(items_count, table,
-                                                    statement, values))
-                        except:
-                            self._logger.exception(
-                                'Executing: {0} with value: {1}'.
-                                format(statement, tuple(value_tables[table])))
-                            raise
-                        finally:
-                            cursor.close()
-
-            if self._commit_after_query:
-                self.commit()
+            processed_items = self._insert_tables(item_tables)
+            self._metrics.increment("rows_inserted", processed_items)
 
         return processed_items
 
@@ -124,8 +206,10 @@ class SQL(object):
         self.commit()
 
         tables = {}
+        table_names, _ = \
+            self.execute_fetch_all_statement(self.get_table_names())
         with self._tables_lock:
-            for table in self._tables:
+            for table, in table_names:
                 statement = \
                     "SELECT * FROM {0} {1}".format(
                         table, "" if rows_per_table == -1 else "LIMIT {0}".
@@ -145,30 +229,178 @@ class SQL(object):
         self.execute_statement(statement)
         self.commit()
 
-    def execute_statement(self, statement, cursor_call=None):
+    def execute_statement(self, statement, cursor_call=None, args=None):
         """ Executes a statement
 
         Args:
             statement: statement to execute
+            args: parameters bound to statement placeholders
         """
 
-        with self._connection_lock:
-            cursor = self.connection.cursor()
-            try:
-                self._logger.debug("Executing query: {}".format(statement))
-                result = cursor.execute(statement)
+        with self._checkout() as connection:
+            return self._execute_on(connection, statement, cursor_call, args)
+
+    def _execute_on(self, connection, statement, cursor_call=None,
+                    args=None):
+        """ Executes a statement over a checked out connection
+        """
+        cursor = connection.cursor()
+        try:
+            self._logger.debug("Executing query: %s", statement)
+            with self._timed_statement("query", statement, args):
+                result = cursor.execute(statement, args)
                 description = cursor.description
+                # statements producing a result set modify no rows
+                modified_rows = result if description is None else 0
                 if cursor_call:
                     result = getattr(cursor, cursor_call)()
+            self._count_query(cursor_call, result)
+        except:
+            self._logger.exception("Could not execute query")
+            raise
+        finally:
+            cursor.close()
+
+        self._statement_executed(connection, modified_rows)
+
+        return result, description
+
+    def execute_statements(self, statements, cursor_call=None, args=None):
+        """ Executes several statements, concurrently over pooled
+        connections when pool allows more than one connection and all
+        statements produce rows, statements modifying data run in order
+        over a single connection along with the rest of statements so
+        that later statements see their changes
+
+        Args:
+            statements: list of statements to execute
+            args: list of parameters for each statement
+
+        Returns:
+            list of (result, description) tuples in statements order
+        """
+        if args is None:
+            args = [None] * len(statements)
+        executor = self._executor
+        if executor is None or len(statements) < 2 or \
+                not all(map(self.returns_rows, statements)):
+            with self._checkout() as connection:
+                return [self._execute_on(connection, statement, cursor_call,
+                                         statement_args)
+                        for statement, statement_args in
+                        zip(statements, args)]
+        futures = [executor.submit(self.execute_statement,
+                                   statement, cursor_call, statement_args)
+                   for statement, statement_args in zip(statements, args)]
+        return [future.result() for future in futures]
+
+    def execute_many(self, statement, args):
+        """ Executes a parameterized statement once per parameters set in
+        a single call
+
+        Args:
+            statement: statement template to execute
+            args: list of parameters sets
+
+        Returns:
+            number of affected rows
+        """
+        with self._checkout() as connection:
+            return self._execute_many_on(connection, statement, args)
+
+    def _execute_many_on(self, connection, statement, args):
+        """ Executes a parameterized statement over a checked out
+        connection once per parameters set
+        """
+        cursor = connection.cursor()
+        try:
+            self._logger.debug("Executing query: %s for: %d "
+                               "parameter sets", statement, len(args))
+            with self._timed_statement("query", statement, args):
+                result = cursor.executemany(statement, args)
+            self._metrics.increment("queries")
+        except:
+            self._logger.exception("Could not execute query")
+            raise
+        finally:
+            cursor.close()
+
+        self._statement_executed(connection, result or 0)
+
+        return result
+
+    def execute_in_order(self, requests, cursor_call=None):
+        """ Executes statements in order over a single connection, so that
+        statements see changes of earlier ones
+
+        Args:
+            requests: list of (statement, args, many) tuples, statements
+                with many set are executed once per parameters set in args
+
+        Returns:
+            list of (result, description) tuples in requests order, result
+            is the number of affected rows of statements with many set
+        """
+        with self._checkout() as connection:
+            return [(self._execute_many_on(connection, statement, args), None)
+                    if many else
+                    self._execute_on(connection, statement, cursor_call, args)
+                    for statement, args, many in requests]
+
+    def returns_rows(self, template):
+        """ Finds out whether a statement template produces a result set,
+        templates are analyzed once and cached
+        """
+        with self._templates_lock:
+            returns_rows = self._templates.get(template)
+            if returns_rows is not None:
+                self._templates.move_to_end(template)
+                return returns_rows
+
+        match = SQL.STATEMENT_KEYWORD.match(template)
+        returns_rows = bool(match) and \
+            match.group(1).upper() in SQL.ROW_STATEMENTS
+        with self._templates_lock:
+            self._templates[template] = returns_rows
+            if len(self._templates) > SQL.TEMPLATES_CACHE_SIZE:
+                self._templates.popitem(last=False)
+        return returns_rows
+
+    def stream_statement(self, statement, chunk_size, args=None):
+        """ Executes a statement fetching results in chunks as they are
+        read from the server, rows are not buffered client side
+
+        Args:
+            statement: statement to execute
+            chunk_size: maximum number of rows per chunk
+            args: parameters bound to statement placeholders
+
+        Yields:
+            (rows, description) tuples
+        """
+        with self._checkout() as connection:
+            cursor = self.get_streaming_cursor(connection)
+            try:
+                self._logger.debug("Streaming query: %s", statement)
+                with self._timed_statement("query", statement, args):
+                    cursor.execute(statement, args)
+                description = cursor.description
+                self._metrics.increment("queries")
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    self._metrics.increment("rows_returned", len(rows))
+                    yield rows, description
+            except GeneratorExit:
+                raise
             except:
                 self._logger.exception("Could not execute query")
+                raise
             finally:
                 cursor.close()
 
-        if self._commit_after_query:
-            self.commit()
-
-        return result, description
+            self._statement_executed(connection)
 
     def execute_fetch_all_statement(self, statement):
         return self.execute_statement(statement, "fetchall")
@@ -178,79 +410,283 @@ class SQL(object):
 
     @property
     def connected(self):
-        with self._connection_lock:
+        with self._connection_locked():
             return self.connection is not None
 
     def get_table_name(self, item):
         """ Finds out table name for a given item
         """
-        try:
-            if callable(self._target_table):
+        if isinstance(self._target_table, str):
+            table_name = self._target_table
+        elif callable(self._target_table):
+            try:
                 table_name = self._target_table(item)
-        except:
-            self._logger.exception(
-                'Target table method failure: {0}'.format(self._target_table))
+            except:
+                self._logger.exception(
+                    'Target table method failure: {0}'.format(
+                        self._target_table))
+                table_name = item.__class__.__name__
+        else:
             table_name = item.__class__.__name__
 
-        if table_name in SQL.TABLE_NAME_TRANSLATIONS:
-            table_name = SQL.TABLE_NAME_TRANSLATIONS[table_name]
-        return table_name
+        return self._table_name_translations.get(table_name, table_name)
+
+    def _route_items(self, items):
+        """ Groups items by the table they go to, table name is found out
+        once per item, and once for all items when target table is constant
+
+        Returns:
+            OrderedDict of items lists by table name
+        """
+        if isinstance(self._target_table, str) and items:
+            table_name = self._target_table
+            return OrderedDict([(self._table_name_translations.get(
+                table_name, table_name), list(items))])
+        item_tables = OrderedDict()
+        for e in items:
+            table_name = self.get_table_name(e)
+            table_items = item_tables.get(table_name)
+            if table_items is None:
+                table_items = item_tables[table_name] = []
+            table_items.append(e)
+        return item_tables
 
     def commit(self):
+        """ Commits changes pending on connections not currently in use
+        """
         if self.connected:
-            with self._connection_lock:
-                try:
-                    self.connection.commit()
-                except:
-                    self._logger.exception('Could not commit changes')
+            with self._connection_locked():
+                self.connection.each_idle(self._commit_pending)
+
+    def end_batch(self):
+        """ Signals the end of a batch of work, changes are committed when
+        committing once per batch
+        """
+        if self._commit_tracker.policy == CommitPolicy.batch:
+            self.commit()
+
+    def stats(self):
+        """ Provides counters and latencies of database operations since
+        driver was created or stats were last reset, latencies are in
+        milliseconds
+        """
+        stats = self._metrics.snapshot()
+        pool = self.connection
+        stats["pool"] = {
+            "size": pool.size if pool else 0,
+            "idle": pool.idle_count if pool else 0
+        }
+        stats["uncommitted_rows"] = self.uncommitted_rows
+        return stats
+
+    def reset_stats(self):
+        self._metrics.reset()
+
+    @property
+    def metrics(self):
+        """ Counters and latencies, callers may record their own
+        """
+        return self._metrics
+
+    @property
+    def uncommitted_rows(self):
+        """ Number of rows modified and not yet committed
+        """
+        return self._commit_tracker.uncommitted_rows
 
     @property
     def connection(self):
+        """ Connection pool backing this driver, None when not connected
+        """
         return self._connection
 
     @connection.setter
     def connection(self, value):
         self._connection = value
 
-    def _get_field_names(self, table):
-        """ Finds out field names for a given table
+    @contextmanager
+    def _checkout(self):
+        """ Provides a pooled connection to use within a with block
+        """
+        pool = self.connection
+        if pool is None:
+            raise RuntimeError("Not connected to database: {0}".format(
+                self._database))
+        start = monotonic()
+        with pool.connection() as connection:
+            self._metrics.observe("checkout_wait", monotonic() - start)
+            yield connection
+
+    @contextmanager
+    def _connection_locked(self):
+        """ Holds the connection lock within a with block, recording how
+        long it took to acquire it
+        """
+        start = monotonic()
+        with self._connection_lock:
+            self._metrics.observe("lock_wait", monotonic() - start)
+            yield
+
+    @contextmanager
+    def _timed_statement(self, metric, statement, args=None):
+        """ Records how long a statement executed within a with block
+        takes, including failed ones
         """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self._statement_timed(metric, statement, args,
+                                  monotonic() - start)
+
+    def _statement_timed(self, metric, statement, args, seconds):
+        self._metrics.observe(metric, seconds)
+        if self._slow_statement_threshold is not None and \
+                seconds >= self._slow_statement_threshold:
+            self._slow_statement(statement, args, seconds)
+
+    def _slow_statement(self, statement, args, seconds):
+        """ Logs one out of every slow_statement_sample slow statements
+        """
+        self._metrics.increment("slow_statements")
+        if next(self._slow_statements) % self._slow_statement_sample:
+            return
+        if args is None:
+            self._logger.warning('Slow statement: %.2f ms, %s',
+                                 seconds * 1000, self._truncate(statement))
+        else:
+            self._logger.warning('Slow statement: %.2f ms, %s, args: %s',
+                                 seconds * 1000, self._truncate(statement),
+                                 self._truncate(repr(args)))
+
+    def _truncate(self, text):
+        if text is None or len(text) <= self._slow_statement_max_length:
+            return text
+        return "{0}... ({1} more characters)".format(
+            text[:self._slow_statement_max_length],
+            len(text) - self._slow_statement_max_length)
+
+    def _open_connection(self):
+        """ Creates a new connection for the pool
+        """
+        with self._metrics.timer("connect"):
+            connection = self.setup_connection()
+        self._metrics.increment("connections_opened")
+        return connection
+
+    def _count_query(self, cursor_call, result):
+        self._metrics.increment("queries")
+        if cursor_call == "fetchall":
+            self._metrics.increment("rows_returned", len(result))
+        elif cursor_call == "fetchone" and result is not None:
+            self._metrics.increment("rows_returned")
+
+    def _commit_connection(self, connection):
+        try:
+            with self._metrics.timer("commit"):
+                connection.commit()
+            self._metrics.increment("commits")
+            self._commit_tracker.committed(connection)
+        except:
+            self._logger.exception('Could not commit changes')
+
+    def _commit_pending(self, connection):
+        if self._commit_tracker.pending(connection):
+            self._commit_connection(connection)
+
+    def _statement_executed(self, connection, modified_rows=0):
+        """ Records work done on a connection, committing it when commit
+        policy says so
+        """
+        if self._commit_tracker.written(connection, modified_rows):
+            self._commit_connection(connection)
 
-        fields_def, _ = self.execute_fetch_all_statement(
-            self.get_fields_statement(table))
-        field_names = self.parse_field_names(fields_def)
-        return field_names
+    def _get_table_fields(self, tables):
+        """ Finds out fields of several tables with a single query
 
-    def _get_field_definitions(self, table):
+        Returns:
+            dict of FieldItem lists by table, tables not existing in
+            database are not included
+        """
+        statement, args = self.get_columns_statement(tables)
+        columns_rows, _ = self.execute_statement(statement, "fetchall", args)
+        table_fields = self.parse_columns(columns_rows)
+        # servers may report names in another case than requested, such
+        # as lower case when storing table names in lower case
+        requested = {table.lower(): table for table in tables}
+        return {requested.get(table.lower(), table): fields
+                for table, fields in table_fields.items()}
+
+    def _get_field_definitions(self, field_item_list):
         """ Provides table definitions
+
+        Args:
+            field_item_list: table fields as FieldItem instances
         """
-        fields = self._get_field_names(table)
-        field_item_list = []
         field_formats = ""
         field_names = ""
         field_no = 0
-        for field in fields:
-            field_item_list.append(SQL.FieldItem(field, None))
+        for field_item in field_item_list:
             field_names += "{0}`{1}`".format("," if field_no else "",
-                                             field)
+                                             field_item.name)
             field_formats += "{0}{1}".format("," if field_no else "",
                                              self.get_field_format())
             field_no += 1
-        return field_item_list, field_names, field_formats
+        return field_names, field_formats
 
     def _create_table(self, table, fields):
-        fields_definition = ""
-        field_no = 0
+        hints = self._schema_hints
+        indexed_columns = hints.indexed_columns() | \
+            {column.lower() for column in self._key_columns}
+        # actual column name by lower case name
+        names = OrderedDict((field.lower(), field) for field in fields)
+
+        definitions = []
+        id_column = hints.id_column
+        if id_column and id_column.lower() in names:
+            self._logger.warning(
+                'Table {0} id column {1} is provided by items, it is not '
+                'auto-incremented'.format(table, id_column))
+            id_column = None
+        if id_column:
+            definitions.append("`{0}` {1}".format(
+                id_column, self.get_auto_id_type()))
+            names[id_column.lower()] = id_column
         for field in fields:
-            primitive_type = type(fields[field])
-            fields_definition += \
-                "{0}`{1}` {2}".format("," if field_no else "",
-                                      field,
-                                      self.get_type(primitive_type))
-            field_no += 1
+            definitions.append("`{0}` {1}".format(
+                field, self._get_column_type(
+                    field, fields[field], field.lower() in indexed_columns)))
+
+        partition_column = self._get_partition_column(table, fields)
+        primary_key = self._get_key_columns(
+            table, names, hints.primary_key or
+            ([id_column] if id_column else []), "primary key",
+            partition_column)
+        if primary_key:
+            definitions.append("PRIMARY KEY ({0})".format(
+                self._quote_columns(primary_key)))
+        if id_column and (not primary_key or primary_key[0] != id_column):
+            # auto-increment columns have to lead a key
+            definitions.append("KEY ({0})".format(
+                self._quote_columns([id_column])))
+        unique_key = self._get_key_columns(
+            table, names, self._key_columns, "unique key", partition_column)
+        if unique_key:
+            definitions.append("UNIQUE KEY ({0})".format(
+                self._quote_columns(unique_key)))
+        for index in hints.indexes:
+            index_columns = self._get_key_columns(table, names, index,
+                                                  "index")
+            if index_columns:
+                definitions.append("INDEX ({0})".format(
+                    self._quote_columns(index_columns)))
 
         statement = "CREATE TABLE IF NOT EXISTS {0}({1})".\
-            format(table, fields_definition)
+            format(table, ",".join(definitions))
+        partition_clause = partition_column and self.get_partition_clause(
+            partition_column, hints.partition_interval, hints.partitions)
+        if partition_clause:
+            statement += " " + partition_clause
         self._logger.debug('Creating table: {0}, statement: {1}'.
                            format(table, statement))
         try:
@@ -259,41 +695,212 @@ class SQL(object):
             self._logger.exception("Error creating table {0}".format(table))
             raise
 
-    def _alter_table(self, table, fields, item):
-        self._logger.info('Altering table: {0}, fields: {1} need to be added'.
-                          format(table, fields))
+    def _get_column_type(self, field, value, indexed=False):
+        length = self._schema_hints.varchar_columns.get(field.lower())
+        if length:
+            return "VARCHAR({0})".format(length)
+        if indexed:
+            return self.get_key_type(type(value), value)
+        return self.get_type(type(value), value)
 
+    def _get_key_columns(self, table, names, columns, description,
+                         partition_column=None):
+        """ Finds out actual names of key columns
+
+        Args:
+            names: actual column names by lower case name
+            columns: key columns
+            description: key description used when logging
+            partition_column: column appended to unique keys of tables
+                partitioned on it
+
+        Returns:
+            list of column names, None when a column is missing
+        """
+        if not columns:
+            return None
+        missing = [column for column in columns
+                   if column.lower() not in names]
+        if missing:
+            self._logger.warning(
+                'Table {0} is created without {1}, columns missing from '
+                'items: {2}'.format(table, description, sorted(missing)))
+            return None
+        key_columns = [names[column.lower()] for column in columns]
+        if partition_column and partition_column not in key_columns:
+            # unique keys of partitioned tables include partition column
+            key_columns.append(partition_column)
+        return key_columns
+
+    def _get_partition_column(self, table, fields):
+        column = self._schema_hints.partition_column
+        if not column:
+            return None
         for field in fields:
-            field_type = type(getattr(item, field))
-            statement = "ALTER TABLE {0} ADD COLUMN `{1}` {2};".\
-                format(table, field, self.get_type(field_type))
+            if field.lower() == column.lower():
+                if isinstance(fields[field], datetime.datetime):
+                    return field
+                break
+        self._logger.warning(
+            'Table {0} is not partitioned, column {1} is missing from items '
+            'or does not hold dates'.format(table, column))
+        return None
+
+    @staticmethod
+    def _quote_columns(columns):
+        return ",".join("`{0}`".format(column) for column in columns)
+
+    def _alter_table(self, table, fields):
+        """ Adds all new fields to a table with a single statement
+
+        Args:
+            table: table name
+            fields: dict of a sample value by field name
+        """
+        self._logger.info('Altering table: {0}, fields: {1} need to be added'.
+                          format(table, list(fields)))
+
+        statement = "ALTER TABLE {0} {1}".format(
+            table, ", ".join(["ADD COLUMN `{0}` {1}".format(
+                field, self._get_column_type(field, fields[field]))
+                for field in fields]))
+        instant_clause = self.get_instant_alter_clause()
+        if instant_clause and self._instant_alter:
+            try:
+                self.execute_statement(statement + instant_clause)
+            except Exception as e:
+                if not self.is_alter_algorithm_error(e):
+                    raise
+                if self.is_unknown_alter_algorithm_error(e):
+                    # server does not know about instant alters at all
+                    self._instant_alter = False
+                self._logger.info(
+                    'Table: {0} cannot be altered in place, details: {1}'.
+                    format(table, str(e)))
+                self.execute_statement(statement)
+        else:
             self.execute_statement(statement)
 
         self._update_field_definitions(table)
 
-    def _get_values(self, item, field_item_list):
-        """ Processes the values for a given item so that
+    def _compile_extractor(self, field_item_list):
+        """ Builds a function processing the values of an item so that
         they can be saved as a row
+
+        Attribute lookup and per column conversion are resolved once per
+        table definition into straight line code instead of being looked
+        up and dispatched for every item and field.
+
+        Args:
+            field_item_list: table fields as FieldItem instances
+
+        Returns:
+            callable receiving an item and returning a list of values
         """
+        namespace = {}
+        lines = ["def extract(item):"]
         values = []
-        for field_item in field_item_list:
-            # old value = getattr(item, field_item.name, None)
-            value = self._get_field_value(item, field_item.name)
-            if value is not None:
-                if field_item.type is None:
-                    field_item.type = type(value)
+        converted = []
+        for index, field_item in enumerate(field_item_list):
+            value = "v{0}".format(index)
+            lines.append("    {0} = getattr(item, {1!r}, None)".format(
+                value, field_item.name))
+            values.append(value)
+            convert = self._get_converter(field_item)
+            if convert is None:
+                converted.append(value)
+            else:
+                namespace["c{0}".format(index)] = convert
+                converted.append("{0} if {0} is None else c{1}({0})".format(
+                    value, index))
+        lines.extend([
+            "    try:",
+            "        return [{0}]".format(", ".join(converted)),
+            "    except Exception:",
+            "        return convert_each([{0}])".format(", ".join(values))
+        ])
+
+        def convert_each(item_values):
+            """ Converts values one at a time so that a failing value is
+            reported and kept as is
+            """
+            return [self._convert_value(field_item_list[index],
+                                        namespace.get("c{0}".format(index)),
+                                        value)
+                    for index, value in enumerate(item_values)]
+
+        namespace["convert_each"] = convert_each
+        exec("\n".join(lines), namespace)
+        return namespace["extract"]
+
+    def _convert_value(self, field_item, convert, value):
+        if value is not None and convert is not None:
+            try:
+                value = convert(value)
+            except Exception as e:
+                self._logger.error(
+                    "Could not get value, field: {0}, type: {1} "
+                    "from value: {2}, details: {3}".format(
+                        field_item.name, field_item.type, value, str(e)))
+        return value
+
+    def _get_columnar_rows(self, connection, field_item_list, items):
+        """ Provides row literals built column by column
+
+        Items are processed in slices the size of an insert statement,
+        values of numeric columns in a slice are converted at once into
+        typed arrays and serialized without going through per value
+        escaping.
 
-                try:
-                    value = self.get_value(value, field_item.type)
-                except Exception as e:
-                    self._logger.error(
-                        "Could not get value, field: {0}, type: {1} "
-                        "from value: {2}, details: {3}".format(
-                            field_item.name, field_item.type, value, str(e)))
+        Args:
+            connection: connection used for escaping values
+            field_item_list: table fields as FieldItem instances
+            items: items to insert
 
-            values.append(value)
+        Yields:
+            row literals
+        """
+        step = self._insert_max_rows if self._insert_max_rows > 0 else \
+            self.COLUMNAR_SLICE_SIZE
+        for start in range(0, len(items), step):
+            items_slice = items[start:start + step]
+            columns = [self._get_column_literals(
+                connection, field_item, items_slice)
+                for field_item in field_item_list]
+            for values in zip(*columns):
+                yield "(" + ",".join(values) + ")"
+
+    def _get_column_literals(self, connection, field_item, items):
+        """ Provides the literals of a column for all items
+        """
+        values = [getattr(item, field_item.name, None) for item in items]
+        typecode = self.get_array_typecode(field_item.type)
+        if typecode is not None and None not in values:
+            try:
+                column = array(typecode, map(field_item.type, values))
+            except (TypeError, ValueError, OverflowError):
+                # values not fitting in an array are converted one by one
+                pass
+            else:
+                return self.escape_array(column)
+
+        convert = self._get_converter(field_item)
+        return (self.escape_value(
+            connection, self._convert_value(field_item, convert, value))
+            for value in values)
+
+    def _get_converter(self, field_item):
+        """ Provides the function converting values of a field, fields of
+        unknown type take the type of the first value found
+        """
+        if field_item.type is not None:
+            return self.get_converter(field_item.type)
 
-        return values
+        def guess_type(value):
+            if field_item.type is None:
+                field_item.type = type(value)
+            return self.get_value(value, field_item.type)
+        return guess_type
 
     def _get_item_dict(self, item):
         try:
@@ -301,23 +908,240 @@ class SQL(object):
         except:
             return item.__dict__
 
-    def _get_field_value(self, item, field):
-        return getattr(item, field, None)
+    @staticmethod
+    def _get_item_signature(item):
+        """ Provides the attribute names of an item, items sharing them
+        provide the same fields, None when item holds no attributes dict
+        """
+        try:
+            return frozenset(vars(item))
+        except TypeError:
+            return None
+
+    def _insert_tables(self, item_tables):
+        """ Inserts items into their tables, concurrently over pooled
+        connections when insert workers allow it
+
+        Args:
+            item_tables: items to insert by table
+
+        Returns:
+            number of items inserted
+        """
+        executor = self._insert_executor
+        if executor is None or len(item_tables) < 2:
+            return sum(self._insert_items(table, items)
+                       for table, items in item_tables.items())
+        futures = [executor.submit(self._insert_items, table, items)
+                   for table, items in item_tables.items()]
+        # let every table complete before raising any failure
+        wait(futures)
+        return sum(future.result() for future in futures)
+
+    def _insert_items(self, table, items, retry=True):
+        """ Inserts items into a table using multi-row INSERT statements,
+        or through the bulk loader when there are at least
+        bulk_load_threshold items, when the insert fails because cached
+        table definitions are stale, definitions are refreshed and the
+        insert of items not yet inserted is attempted once more
+
+        Returns:
+            number of items inserted
+        """
+        with self._tables_lock:
+            if table not in self._tables:
+                return 0
+            field_names = self._tables[table]["field_names"]
+            prefix = self._tables[table]["insert_prefix"]
+            suffix = self._tables[table]["insert_suffix"]
+            extractor = self._tables[table]["extractor"]
+            field_item_list = self._tables[table]["field_item_list"]
+
+        inserted = 0
+        with self._checkout() as connection:
+            if self._insert_columnar:
+                rows = self._get_columnar_rows(
+                    connection, field_item_list, items)
+            else:
+                rows = (self.escape_row(connection, extractor(e))
+                        for e in items)
+            cursor = connection.cursor()
+            statement = None
+            try:
+                loaded = None
+                # bulk loads cannot update conflicting rows
+                if 0 < self._bulk_load_threshold <= len(items) and \
+                        self._conflict_mode != ConflictMode.update and \
+                        self.can_bulk_load(field_item_list):
+                    statement = "Bulk load into {0}".format(table)
+                    loaded = self._load_items(
+                        cursor, table, field_names, extractor, items)
+                if loaded is not None:
+                    inserted = loaded
+                else:
+                    for chunk in self._chunk_rows(
+                            rows, len(prefix) + len(suffix)):
+                        statement = prefix + ",".join(chunk) + suffix
+                        start = monotonic()
+                        with self._timed_statement("insert", statement):
+                            cursor.execute(statement)
+                        inserted += len(chunk)
+                        self._logger.debug(
+                            'Inserted: %d rows, %d characters into: %s '
+                            'in %.2f ms', len(chunk), len(statement), table,
+                            (monotonic() - start) * 1000)
+            except Exception as e:
+                if retry and self.is_schema_error(e):
+                    self._logger.warning(
+                        'Table {0} definitions are out of sync, '
+                        'refreshing, details: {1}'.format(table, str(e)))
+                    # rows of chunks inserted so far follow commit policy
+                    if inserted:
+                        self._statement_executed(connection, inserted)
+                else:
+                    self._logger.exception(
+                        'Executing: %s', self._truncate(statement))
+                    raise
+            else:
+                self._statement_executed(connection, inserted)
+                return inserted
+            finally:
+                cursor.close()
+
+        # cached definitions were stale, reload them and try again
+        self._forget_table(table)
+        remaining = items[inserted:]
+        self._adjust_tables_structure({table: remaining}, False)
+        return inserted + self._insert_items(table, remaining, False)
+
+    def _load_items(self, cursor, table, field_names, extractor, items):
+        """ Loads items through the server's bulk loader
+
+        Returns:
+            number of rows loaded, None when items have to be inserted
+            through INSERT statements instead
+        """
+        statement = "Bulk load into {0}".format(table)
+        start = monotonic()
+        try:
+            loaded = self.bulk_load(cursor, table, field_names,
+                                    (extractor(e) for e in items))
+        except Exception as e:
+            if not self.is_bulk_load_rejected_error(e):
+                raise
+            # server does not allow bulk loads, stop attempting them
+            self._bulk_load_threshold = 0
+            self._logger.warning(
+                'Bulk loads are rejected, inserting instead, details: {0}'.
+                format(str(e)))
+            return None
+        if loaded is not None:
+            self._statement_timed("insert", statement, None,
+                                  monotonic() - start)
+            self._logger.debug('Bulk loaded: %d of %d rows into: %s',
+                               loaded, len(items), table)
+        return loaded
+
+    def _chunk_rows(self, rows, overhead):
+        """ Groups row literals into chunks fitting in a single statement
+
+        A chunk holds at most insert_max_rows rows, and its size, including
+        the statement overhead, stays within both insert_max_bytes and the
+        largest statement the server accepts; a single row exceeding the
+        size limit is sent on its own.
+
+        Args:
+            rows: iterable of row literals
+            overhead: size of the statement without any rows
+
+        Yields:
+            lists of row literals
+        """
+        max_bytes = self._insert_max_bytes
+        if self._max_statement_size:
+            max_bytes = min(max_bytes, self._max_statement_size)
+
+        chunk = []
+        size = overhead
+        for row in rows:
+            # account for row separator
+            row_size = (len(row) if row.isascii() else
+                        len(row.encode())) + 1
+            if chunk and (0 < self._insert_max_rows <= len(chunk) or
+                          size + row_size > max_bytes):
+                yield chunk
+                chunk = []
+                size = overhead
+            chunk.append(row)
+            size += row_size
+        if chunk:
+            yield chunk
+
+    def _get_update_names(self, field_item_list):
+        """ Finds out table columns updated when inserted rows conflict
+        with existing rows
+        """
+        if self._conflict_mode != ConflictMode.update:
+            return []
+        if self._update_columns:
+            update_columns = {column.lower()
+                              for column in self._update_columns}
+            return [field.name for field in field_item_list
+                    if field.name.lower() in update_columns]
+        key_columns = {column.lower() for column in self._key_columns}
+        if self._schema_hints.id_column:
+            # generated ids are kept
+            key_columns.add(self._schema_hints.id_column.lower())
+        return [field.name for field in field_item_list
+                if field.name.lower() not in key_columns]
+
+    def _forget_table(self, table):
+        """ Drops cached definitions for a table so that they are
+        reloaded next time the table is targeted
+        """
+        with self._tables_lock:
+            self._tables.pop(table, None)
+
+    def _load_tables(self, tables):
+        """ Loads definitions of several tables with a single query,
+        tables not existing in database are ignored
+        """
+        table_fields = self._get_table_fields(tables)
+        for table in table_fields:
+            self._update_field_definitions(table, table_fields[table])
+        self._logger.debug('Loaded definitions for tables: {0}'.format(
+            list(table_fields)))
 
-    def _update_field_definitions(self, table):
+    def _update_field_definitions(self, table, field_item_list=None):
         """ Updates internal table definitions
+
+        Args:
+            table: table name
+            field_item_list: table fields, retrieved from database when
+                not provided
         """
         try:
+            if field_item_list is None:
+                field_item_list = self._get_table_fields([table]).get(table)
+                if field_item_list is None:
+                    raise RuntimeError(
+                        "Table {0} does not exist".format(table))
+            field_names, field_formats = \
+                self._get_field_definitions(field_item_list)
+            extractor = self._compile_extractor(field_item_list)
+            insert_prefix, insert_suffix = self.get_insert_clauses(
+                table, field_names, self._get_update_names(field_item_list))
             with self._tables_lock:
-                self._tables[table]["field_item_list"], \
-                    self._tables[table]["field_names"], \
-                    self._tables[table]["field_formats"] = \
-                    self._get_field_definitions(table)
+                self._tables[table]["field_item_list"] = field_item_list
+                self._tables[table]["field_names"] = field_names
+                self._tables[table]["field_formats"] = field_formats
+                self._tables[table]["extractor"] = extractor
+                self._tables[table]["insert_prefix"] = insert_prefix
+                self._tables[table]["insert_suffix"] = insert_suffix
 
                 # create a case insensitive field list
                 self._tables[table]["field_list"] = \
-                    [field.name.lower()
-                     for field in self._tables[table]["field_item_list"]]
+                    [field.name.lower() for field in field_item_list]
 
             self._logger.debug('Updated field definitions for table: {0}'.
                                format(table))
@@ -334,18 +1158,18 @@ class SQL(object):
 
     def _check_table(self, table, fields):
         """ Makes sure a table exists and updates internal table
-        definitions
+        definitions, tables already known are not checked again
         """
-        statement = self.get_table_exists_statement(table)
+        with self._tables_lock:
+            if table in self._tables:
+                return
+
         try:
-            with self._connection_lock:
-                cursor = self.connection.cursor()
-                try:
-                    cursor.execute(statement)
-                    (count,) = cursor.fetchone()
-                finally:
-                    cursor.close()
-            if not count:
+            # loading table definitions tells whether table exists
+            self._load_tables([table])
+            with self._tables_lock:
+                exists = table in self._tables
+            if not exists:
                 self._logger.debug('Creating table {0}'.format(table))
                 self._create_table(table, fields)
                 self._update_field_definitions(table)
@@ -354,66 +1178,229 @@ class SQL(object):
             self._logger.exception("Failed to find out whether table exists")
             raise
 
-    def _adjust_tables_structure(self, items, in_error_mode=False):
+    def _adjust_tables_structure(self, item_tables, in_error_mode=False):
         """ Makes sure table columns structure is up to date and can handle
-            all item attributes
-        """
-        for e in items:
-            item_dict = self._get_item_dict(e)
-            table_name = self.get_table_name(e)
-            self._check_table(table_name, item_dict)
+            all item attributes, fields of all items targeting a table are
+            gathered so that the table is created or altered only once
 
-            new_fields = []
+        Args:
+            item_tables: items lists by table name
+        """
+        # sample value of each field by table, each distinct attributes
+        # combination of a table is looked at only once
+        table_fields = OrderedDict()
+        for table_name, table_items in item_tables.items():
+            fields = table_fields[table_name] = OrderedDict()
+            checked = set()
+            for e in table_items:
+                # attribute names tell items apart without converting
+                # every item to a dict
+                signature = self._get_item_signature(e)
+                if signature in checked:
+                    continue
+                item_dict = self._get_item_dict(e)
+                if signature is None:
+                    signature = ("fields", frozenset(item_dict))
+                    if signature in checked:
+                        continue
+                checked.add(signature)
+
+                for field in item_dict:
+                    if fields.get(field) is None:
+                        fields[field] = item_dict[field]
+
+        for table_name in table_fields:
+            fields = table_fields[table_name]
+            self._check_table(table_name, fields)
+
+            new_fields = OrderedDict()
             with self._tables_lock:
                 if table_name in self._tables:
                     # any fields not in table?
-                    new_fields = [field for field in item_dict
-                                  if field.lower() not in
-                                  self._tables[table_name]["field_list"]]
+                    known_fields = set(self._tables[table_name]["field_list"])
+                    for field in fields:
+                        if field.lower() not in known_fields:
+                            known_fields.add(field.lower())
+                            new_fields[field] = fields[field]
             if len(new_fields):
                 try:
-                    self._alter_table(table_name, new_fields, e)
+                    self._alter_table(table_name, new_fields)
                 except Exception as e:
                     if not in_error_mode:
                         self._logger.warning(
                             'Table {0} might be out of sync, new fields '
-                            'are: {1}'.format(table_name, new_fields))
-                        # make a call to update field definitions in case
-                        # it is out of sync.
-                        self._update_field_definitions(table_name)
+                            'are: {1}'.format(table_name, list(new_fields)))
+                        # drop cached definitions in case they are out of
+                        # sync, they are reloaded when checking table again
+                        self._forget_table(table_name)
                         # and try again
-                        self._adjust_tables_structure(items, True)
+                        self._adjust_tables_structure(item_tables, True)
                         self._logger.info('Table: {0}, successfully '
                                           'recovered from out of sync '
                                           'condition'.format(table_name))
+                        return
                     else:
                         self._logger.error(
                             'Table {0} structure could not be updated, '
                             'new fields are: {1}'.
-                            format(table_name, new_fields))
+                            format(table_name, list(new_fields)))
                         raise e
 
     # implementation specific methods
     def setup_connection(self):
+        """ Creates a new database connection
+        """
         pass
 
-    def get_type(self, primitive_type):
+    def check_connection(self, connection):
+        """ Raises if a connection is no longer usable
+        """
         pass
 
-    def get_field_format(self):
+    def is_connection_error(self, exception):
+        return False
+
+    def get_type(self, primitive_type, value=None):
+        """ Provides column type of values of a python type
+
+        Args:
+            primitive_type: python type of values
+            value: sample value, when given the column type may depend on
+                it, such as a wider type for large numbers
+        """
         pass
 
-    def get_fields_statement(self, table):
+    def get_key_type(self, primitive_type, value=None):
+        """ Provides column type of a key column, key columns have to be
+        indexable
+        """
+        return self.get_type(primitive_type, value)
+
+    def get_auto_id_type(self):
+        """ Provides column type of an auto-increment id column
+        """
         pass
 
-    def parse_field_names(self, fields_def):
-        return []
+    def get_partition_clause(self, column, interval, partitions):
+        """ Provides table partitioning by range on a datetime column
 
-    def get_table_exists_statement(self, table):
+        Args:
+            column: datetime column
+            interval (PartitionInterval): time span of each partition
+            partitions: number of partitions starting at current interval
+        """
+        pass
+
+    def get_insert_clauses(self, table, field_names, update_names):
+        """ Provides statement text preceding and following inserted rows
+
+        Args:
+            table: table rows are inserted into
+            field_names: comma separated column names
+            update_names: columns updated on conflicting rows
+
+        Returns:
+            (prefix, suffix) tuple
+        """
+        return "INSERT INTO {0} ({1}) VALUES ".format(table, field_names), ""
+
+    def get_field_format(self):
         pass
 
     def get_value(self, value, type_in):
         pass
 
+    def get_converter(self, type_in):
+        """ Provides the function converting values stored in a column of
+        given type, None when values are stored as they are
+        """
+        return lambda value: self.get_value(value, type_in)
+
     def get_table_names(self):
         pass
+
+    def get_columns_statement(self, tables):
+        """ Provides a statement listing columns of given tables, ordered
+        by table and column position
+
+        Returns:
+            (statement, args) tuple
+        """
+        pass
+
+    def parse_columns(self, columns_rows):
+        """ Parses rows resulting from columns statement
+
+        Returns:
+            dict of FieldItem lists by table
+        """
+        return {}
+
+    def is_schema_error(self, exception):
+        return False
+
+    def get_instant_alter_clause(self):
+        """ Provides the clause asking for an ALTER TABLE to be done
+        without rebuilding the table
+        """
+        return None
+
+    def is_alter_algorithm_error(self, exception):
+        return False
+
+    def is_unknown_alter_algorithm_error(self, exception):
+        return False
+
+    def get_streaming_cursor(self, connection):
+        """ Provides a cursor reading results from the server on demand
+        """
+        return connection.cursor()
+
+    def escape_row(self, connection, values):
+        """ Provides the literal representation of a row of values
+        """
+        pass
+
+    def escape_value(self, connection, value):
+        """ Provides the literal representation of a value
+        """
+        pass
+
+    def bulk_load(self, cursor, table, field_names, rows):
+        """ Loads rows into a table through the server's bulk loader
+
+        Args:
+            cursor: cursor to execute load with
+            table: table name
+            field_names: field names as used in insert statements
+            rows: iterable of lists of values
+
+        Returns:
+            number of rows loaded, None when bulk loads are not supported
+        """
+        return None
+
+    def is_bulk_load_rejected_error(self, exception):
+        return False
+
+    def can_bulk_load(self, field_item_list):
+        """ Tells whether values of table fields can go through the bulk
+        loader
+        """
+        return True
+
+    def get_array_typecode(self, type_in):
+        """ Provides the array typecode able to hold values of a column
+        type, None when values are not held in arrays
+        """
+        return None
+
+    def escape_array(self, column):
+        """ Provides the literal representations of values held in an array
+        """
+        pass
+
+    def get_max_statement_size(self):
+        """ Provides the size of the largest statement the server accepts
+        """
+        return None
@@ -1,13 +1,22 @@
+import os
 from datetime import timedelta
+from threading import Event
 
+from nio.command import command
 from nio.util.versioning.dependency import DependsOn
 from nio.util.discovery import not_discoverable
 from nio.block.base import Block
 from nio.properties import TimeDeltaProperty, StringProperty, \
-    ObjectProperty, IntProperty, PropertyHolder, BoolProperty
+    ObjectProperty, IntProperty, PropertyHolder, BoolProperty, \
+    SelectProperty, ListProperty
+from nio.types import StringType
 from nio.modules.scheduler import Job
+from nio.util.threading import spawn
 
+from .driver.commit_tracker import CommitPolicy
 from .driver.mysql import MySQL
+from .signal_spool import SignalSpool
+from .write_behind_queue import WriteBehindQueue, OverflowPolicy
 
 
 class Credentials(PropertyHolder):
@@ -21,8 +30,113 @@ class Credentials(PropertyHolder):
     password = StringProperty(title='Password', default='[[MYSQL_PASSWORD]]')
 
 
+class PoolSettings(PropertyHolder):
+
+    """ Connection pool settings
+    Properties:
+        min_size (int): Connections to open upfront and keep when idle
+        max_size (int): Maximum number of simultaneous connections
+        checkout_timeout (timedelta): How long to wait for a connection
+            when all of them are in use
+        idle_timeout (timedelta): How long a connection can stay idle
+            before being closed
+    """
+    min_size = IntProperty(title='Minimum Size', default=1)
+    max_size = IntProperty(title='Maximum Size', default=4)
+    checkout_timeout = TimeDeltaProperty(title='Checkout Timeout',
+                                         default={"seconds": 10})
+    idle_timeout = TimeDeltaProperty(title='Idle Timeout',
+                                     default={"seconds": 300})
+
+
+class CommitSettings(PropertyHolder):
+
+    """ Commit policy settings
+    Properties:
+        policy (CommitPolicy): When changes are committed, after every
+            statement, every number of rows, every interval, once per
+            batch of signals or only when closing the connection
+        rows (int): Rows modified before a commit on rows policy
+        interval (timedelta): How long changes stay uncommitted on
+            interval policy
+    """
+    policy = SelectProperty(CommitPolicy, title='Policy',
+                            default=CommitPolicy.on_close)
+    rows = IntProperty(title='Rows per Commit', default=1000)
+    interval = TimeDeltaProperty(title='Commit Interval',
+                                 default={"seconds": 1})
+
+
+class SlowStatementSettings(PropertyHolder):
+
+    """ Slow statement log settings, when enabled statements taking
+    longer than threshold are logged as warnings
+    Properties:
+        enabled (bool): Whether slow statements are logged
+        threshold (timedelta): Statements taking at least this long are
+            considered slow
+        sample (int): Log one out of every this many slow statements
+        max_length (int): Maximum number of characters logged of a
+            statement and of its values
+    """
+    enabled = BoolProperty(title='Enabled', default=False)
+    threshold = TimeDeltaProperty(title='Threshold',
+                                  default={"seconds": 1})
+    sample = IntProperty(title='Sample', default=1)
+    max_length = IntProperty(title='Maximum Length', default=200)
+
+
+class WriteBehindSettings(PropertyHolder):
+
+    """ Write-behind settings, when enabled signals are queued and
+    processed by worker threads instead of the calling thread
+    Properties:
+        enabled (bool): Whether signals are queued
+        capacity (int): Maximum number of queued signals
+        batch_size (int): Maximum number of signals processed at once
+        flush_interval (timedelta): How long to wait for a full batch
+        workers (int): Number of threads processing queued signals
+        overflow_policy (OverflowPolicy): What to do with incoming signals
+            when queue is full
+    """
+    enabled = BoolProperty(title='Enabled', default=False)
+    capacity = IntProperty(title='Queue Capacity', default=10000)
+    batch_size = IntProperty(title='Batch Size', default=500)
+    flush_interval = TimeDeltaProperty(title='Flush Interval',
+                                       default={"seconds": 1})
+    workers = IntProperty(title='Workers', default=1)
+    overflow_policy = SelectProperty(OverflowPolicy,
+                                     title='Overflow Policy',
+                                     default=OverflowPolicy.block)
+
+
+class SpoolSettings(PropertyHolder):
+
+    """ Spool settings, when enabled signals received while disconnected
+    are saved to disk and replayed once connection is reestablished
+    Properties:
+        enabled (bool): Whether signals are spooled
+        directory (str): Directory where spool files are kept, a
+            subdirectory named after the block is used
+        segment_size (int): Size in bytes of each spool file
+        max_size (int): Maximum size in bytes of all spool files
+        replay_batch_size (int): Maximum number of signals replayed at once
+        replay_rate (int): Maximum signals replayed per second, 0 for no
+            limit
+    """
+    enabled = BoolProperty(title='Enabled', default=False)
+    directory = StringProperty(title='Directory', default='spool')
+    segment_size = IntProperty(title='Segment Size', default=4194304)
+    max_size = IntProperty(title='Maximum Size', default=104857600)
+    replay_batch_size = IntProperty(title='Replay Batch Size', default=500)
+    replay_rate = IntProperty(title='Replay Rate', default=1000)
+
+
 @not_discoverable
 @DependsOn("nio.modules.scheduler")
+@command("queue_stats")
+@command("stats")
+@command("reset_stats")
 class MySQLBase(Block):
 
     """ A block for inserting data into a MySQL database.
@@ -30,9 +144,17 @@ class MySQLBase(Block):
         host (str): location of the database
         port (int): open port served by database
         database (str): database name
-        commit_after_query: Specifies how many records before a commit call.
+        commit_after_query: Whether to commit after every statement,
+            takes precedence over commit policy.
+        commit_policy: When changes are committed.
         retry_timeout: When disconnected, this specifies how long to wait
                        before attempting to connect.
+        pool: Connection pool settings.
+        write_behind: Queue signals and process them asynchronously.
+        spool: Save signals received while disconnected to disk.
+        preload_tables: Tables whose definitions are loaded when
+            connecting, other tables are loaded when first targeted.
+        slow_statements: Log statements taking longer than a threshold.
     """
     host = StringProperty(title='MySQL Host', default='[[MYSQL_HOST]]')
     port = IntProperty(title='Port', default=3306)
@@ -40,13 +162,25 @@ class MySQLBase(Block):
     credentials = ObjectProperty(Credentials, title='Connection Credentials')
     commit_after_query = BoolProperty(
         title='Commit After Query', default=False)
+    commit_policy = ObjectProperty(CommitSettings, title='Commit Policy')
     retry_timeout = TimeDeltaProperty(title="Retry Timeout",
                                       default={"seconds": 1})
+    pool = ObjectProperty(PoolSettings, title='Connection Pool')
+    write_behind = ObjectProperty(WriteBehindSettings, title='Write Behind')
+    spool = ObjectProperty(SpoolSettings, title='Spool')
+    preload_tables = ListProperty(StringType, title='Preload Tables',
+                                  default=[])
+    slow_statements = ObjectProperty(SlowStatementSettings,
+                                     title='Slow Statement Log')
 
     def __init__(self):
         super().__init__()
         self._db = None
         self._connection_job = None
+        self._commit_job = None
+        self._write_behind = None
+        self._spool = None
+        self._replay_stop = Event()
 
     def configure(self, context):
         super().configure(context)
@@ -55,29 +189,109 @@ class MySQLBase(Block):
                          self.credentials().password(),
                          self.commit_after_query(),
                          self.logger,
-                         target_table=self.get_target_table())
+                         target_table=self.get_target_table(),
+                         pool_min_size=self.pool().min_size(),
+                         pool_max_size=self.pool().max_size(),
+                         pool_checkout_timeout=self.pool().
+                         checkout_timeout().total_seconds(),
+                         pool_idle_timeout=self.pool().
+                         idle_timeout().total_seconds(),
+                         preload_tables=self.preload_tables(),
+                         commit_policy=self._get_commit_policy(),
+                         commit_rows=self.commit_policy().rows(),
+                         commit_interval=self.commit_policy().
+                         interval().total_seconds(),
+                         slow_statement_threshold=self.slow_statements().
+                         threshold().total_seconds()
+                         if self.slow_statements().enabled() else None,
+                         slow_statement_sample=self.slow_statements().
+                         sample(),
+                         slow_statement_max_length=self.slow_statements().
+                         max_length(),
+                         **self.get_driver_options())
+        if self.write_behind().enabled():
+            self._write_behind = WriteBehindQueue(
+                self._handle_signals,
+                self.write_behind().capacity(),
+                self.write_behind().batch_size(),
+                self.write_behind().flush_interval().total_seconds(),
+                self.write_behind().workers(),
+                self.write_behind().overflow_policy(),
+                self.logger)
+        if self.spool().enabled():
+            self._spool = SignalSpool(
+                os.path.join(self.spool().directory(), self.name()),
+                self.spool().segment_size(),
+                self.spool().max_size(),
+                self.logger)
         self._connect()
 
+    def start(self):
+        super().start()
+        if self._write_behind:
+            self._write_behind.start()
+        if self._get_commit_policy() == CommitPolicy.interval:
+            self._commit_job = Job(self._commit,
+                                   self.commit_policy().interval(),
+                                   repeatable=True)
+        self._replay_spool()
+
     def stop(self):
+        # Process signals still queued while connection is available
+        if self._write_behind:
+            self._write_behind.stop()
+
+        if self._spool:
+            self._replay_stop.set()
+            self._spool.close()
+
         # Cancel pending reconnects if any
         if self._connection_job:
             self._connection_job.cancel()
             self._connection_job = None
 
+        if self._commit_job:
+            self._commit_job.cancel()
+            self._commit_job = None
+
+        # closing the connection commits pending changes
         self._close_connection()
         super().stop()
 
     def process_signals(self, signals, input_id='default'):
-        if self.connected:
-            self.deliver_signals(signals)
+        if self._write_behind:
+            self._write_behind.put(signals)
         else:
-            self._on_discarded_signals(signals)
+            self._handle_signals(signals)
+
+    def queue_stats(self):
+        """ Provides write-behind queue depth and drain rate
+        """
+        if self._write_behind:
+            return self._write_behind.stats()
+        return {}
+
+    def stats(self):
+        """ Provides counters and latencies of database operations,
+        connection pool usage and write-behind queue state
+        """
+        stats = self._db.stats()
+        if self._write_behind:
+            stats["queue"] = self._write_behind.stats()
+        return stats
+
+    def reset_stats(self):
+        """ Resets counters and latencies
+        """
+        self._db.reset_stats()
 
     def deliver_signals(self, signals, retry=True):
         """ Allows for a retry when processing
         signals, currently if signals fail to be delivered
         the first time, and it was a connection issue, it will
-        try, only once, to reconnect and deliver again.
+        try, only once, to reconnect and deliver again. Signals that
+        could not be delivered because of a connection issue are spooled
+        when spooling is enabled.
         """
         try:
             output = self.execute_query(signals)
@@ -86,7 +300,9 @@ class MySQLBase(Block):
                 self.notify_signals(output)
         except Exception as e:
             exception_details = str(e)
-            if "connect" in exception_details.lower() and retry:
+            if "connect" not in exception_details.lower():
+                self.logger.exception('Unable to execute query')
+            elif retry:
                 # attempt an immediate reconnect
                 self._reconnect()
                 # if reconnected fine
@@ -95,8 +311,10 @@ class MySQLBase(Block):
                     self.deliver_signals(signals, False)
                 else:
                     self.logger.exception('Unable to reconnect and send')
+                    self._on_discarded_signals(signals)
             else:
-                self.logger.exception('Unable to execute query')
+                self.logger.exception('Unable to send after reconnecting')
+                self._on_discarded_signals(signals)
 
     def execute_query(self, signals):
         """ To be implemented by inheriting classes
@@ -109,6 +327,11 @@ class MySQLBase(Block):
         """
         return None
 
+    def get_driver_options(self):
+        """ Allows child classes to provide additional driver settings
+        """
+        return {}
+
     def _connect(self):
         """ Connect to database, this method as built-in
         reconnection functionality
@@ -126,6 +349,17 @@ class MySQLBase(Block):
                 timedelta(seconds=self.retry_timeout().total_seconds()),
                 repeatable=False)
 
+    def _get_commit_policy(self):
+        if self.commit_after_query():
+            return CommitPolicy.statement
+        return self.commit_policy().policy()
+
+    def _commit(self):
+        try:
+            self._db.commit()
+        except Exception:
+            self.logger.exception('Periodic commit failed')
+
     def _close_connection(self):
         if self.connected:
             try:
@@ -136,13 +370,57 @@ class MySQLBase(Block):
                     "Failed to close connection, details".format(str(e)))
 
     def _reconnect(self):
+        self._db.metrics.increment("reconnects")
         self._connection_job = None
         self._close_connection()
         self._connect()
+        self._replay_spool()
+
+    def _replay_spool(self):
+        """ Replays spooled signals in the background when connected
+        """
+        if self._spool and not self._spool.empty and self.connected:
+            self._replay_stop.clear()
+            spawn(self._replay)
+
+    def _replay(self):
+        spool_settings = self.spool()
+        try:
+            replayed = self._spool.replay(
+                self._deliver_replayed,
+                spool_settings.replay_batch_size(),
+                spool_settings.replay_rate(),
+                self._replay_stop)
+            if replayed:
+                self.logger.info(
+                    'Replayed: {0} spooled signals'.format(replayed))
+        except Exception:
+            self.logger.exception(
+                'Spool replay interrupted, it will resume on next connect')
+
+    def _deliver_replayed(self, signals):
+        output = self.execute_query(signals)
+        if output:
+            self.notify_signals(output)
+        self._db.end_batch()
+
+    def _handle_signals(self, signals):
+        if self.connected:
+            self.deliver_signals(signals)
+            self._db.end_batch()
+        else:
+            self._on_discarded_signals(signals)
 
     def _on_discarded_signals(self, signals):
-        # TODO, good place to implement functionality for
-        # "saving" signals hoping for a reconnect and have no-loss
+        if self._spool:
+            if self._spool.append(signals):
+                self._db.metrics.increment("signals_spooled", len(signals))
+                self.logger.debug(
+                    'Block is not connected, spooled: {0} signals'.format(
+                        len(signals)))
+                return
+            self.logger.warning('Spool is full')
+        self._db.metrics.increment("signals_discarded", len(signals))
         self.logger.warning(
             'Block is not connected, discarding: {0} signals'.format(
                 len(signals))
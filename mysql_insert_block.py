@@ -1,22 +1,161 @@
 from nio import Signal
-from nio.properties import Property, VersionProperty
+from nio.properties import Property, VersionProperty, IntProperty, \
+    BoolProperty, ListProperty, PropertyHolder, StringProperty, \
+    ObjectProperty, SelectProperty
+from nio.types import StringType
 
+from .driver.schema import PartitionInterval, SchemaHints
+from .driver.sql import ConflictMode
 from .mysql_base_block import MySQLBase
 
 
+class TableTranslation(PropertyHolder):
+
+    """ Table name replacing a table name resulting from target table
+    Properties:
+        name (str): Table name as resulting from target table
+        table (str): Table signals are inserted into instead
+    """
+    name = StringProperty(title='Name', default='')
+    table = StringProperty(title='Table', default='')
+
+
+class ConflictSettings(PropertyHolder):
+
+    """ What happens to signals conflicting with existing rows
+    Properties:
+        mode (ConflictMode): Whether conflicting rows fail the insert, are
+            ignored, replace existing rows or update them
+        key_columns (list): Columns identifying a row, tables created by
+            the block get a unique key over them
+        update_columns (list): Columns updated in existing rows, all non
+            key columns when empty
+    """
+    mode = SelectProperty(ConflictMode, title='Mode',
+                          default=ConflictMode.error)
+    key_columns = ListProperty(StringType, title='Key Columns', default=[])
+    update_columns = ListProperty(StringType, title='Update Columns',
+                                  default=[])
+
+
+class VarcharColumn(PropertyHolder):
+
+    """ Text column created as VARCHAR instead of TEXT
+    Properties:
+        name (str): Column name
+        length (int): Maximum number of characters
+    """
+    name = StringProperty(title='Name', default='')
+    length = IntProperty(title='Length', default=255)
+
+
+class SchemaSettings(PropertyHolder):
+
+    """ Keys, indexes, column types and partitioning applied to tables
+    created by the block
+    Properties:
+        id_column (str): Auto-increment id column added to tables, none
+            when empty
+        primary_key (list): Primary key columns, id column when empty
+        indexes (list): Secondary indexes, comma separated columns each
+        varchar_columns (list): Text columns created as VARCHAR
+        partition_column (str): Datetime column tables are partitioned by
+            range on, none when empty
+        partition_interval (PartitionInterval): Time span of a partition
+        partitions (int): Number of partitions created ahead
+    """
+    id_column = StringProperty(title='Id Column', default='')
+    primary_key = ListProperty(StringType, title='Primary Key', default=[])
+    indexes = ListProperty(StringType, title='Indexes', default=[])
+    varchar_columns = ListProperty(VarcharColumn, title='Varchar Columns',
+                                   default=[])
+    partition_column = StringProperty(title='Partition Column', default='')
+    partition_interval = SelectProperty(PartitionInterval,
+                                        title='Partition Interval',
+                                        default=PartitionInterval.month)
+    partitions = IntProperty(title='Partitions', default=12)
+
+
 class MySQLInsert(MySQLBase):
 
     """ A block for inserting data into a MySQL database.
     Properties:
         target_table = ExpressionProperty(
             title='Target table', default="{{($__class__.__name__)}}")
+        max_rows_per_insert: Maximum rows sent in a single INSERT statement
+        max_bytes_per_insert: Maximum size of a single INSERT statement,
+            statements are further limited by server's max_allowed_packet
+        columnar_inserts: whether insert rows are built column by column,
+            numeric columns being converted at once through typed arrays
+        bulk_load_threshold: number of signals for a table in a batch from
+            which they are loaded through LOAD DATA LOCAL INFILE instead
+            of INSERT statements, 0 disables bulk loads
+        insert_workers: number of tables of a batch inserted into
+            concurrently, limited by connection pool maximum size
+        table_translations: table names replacing table names resulting
+            from target table
+        on_conflict: what happens to signals conflicting with existing
+            rows on key columns
+        schema: keys, indexes, column types and partitioning of tables
+            created by the block
     """
     target_table = Property(
         title='Target table', default="{{($__class__.__name__)}}")
+    max_rows_per_insert = IntProperty(
+        title='Max Rows per Insert', default=1000)
+    max_bytes_per_insert = IntProperty(
+        title='Max Bytes per Insert', default=1048576)
+    columnar_inserts = BoolProperty(title='Columnar Inserts', default=False)
+    bulk_load_threshold = IntProperty(title='Bulk Load Threshold', default=0)
+    insert_workers = IntProperty(title='Insert Workers', default=1)
+    table_translations = ListProperty(
+        TableTranslation, title='Table Name Translations',
+        default=[{"name": "Signal", "table": "NIOSignal"}])
+    on_conflict = ObjectProperty(ConflictSettings, title='On Conflict')
+    schema = ObjectProperty(SchemaSettings, title='Table Schema')
     version = VersionProperty("0.0.1")
 
     def get_target_table(self):
-        return self.target_table()
+        """ Provides table name when target table is a plain name, so
+        that it is evaluated once, otherwise a callable evaluating target
+        table for each signal, expressions not referencing signals may
+        still change over time
+        """
+        expression = getattr(self.target_table, "value", None)
+        if isinstance(expression, str) and "{{" not in expression:
+            return self.target_table()
+        return self.target_table
+
+    def get_driver_options(self):
+        return {
+            "insert_max_rows": self.max_rows_per_insert(),
+            "insert_max_bytes": self.max_bytes_per_insert(),
+            "insert_columnar": self.columnar_inserts(),
+            "bulk_load_threshold": self.bulk_load_threshold(),
+            "insert_workers": self.insert_workers(),
+            "table_name_translations": {
+                translation.name(): translation.table()
+                for translation in self.table_translations()
+            },
+            "conflict_mode": self.on_conflict().mode(),
+            "key_columns": self.on_conflict().key_columns(),
+            "update_columns": self.on_conflict().update_columns(),
+            "schema_hints": self._get_schema_hints()
+        }
+
+    def _get_schema_hints(self):
+        schema = self.schema()
+        return SchemaHints(
+            id_column=schema.id_column(),
+            primary_key=schema.primary_key(),
+            indexes=[[column.strip() for column in index.split(",")
+                      if column.strip()]
+                     for index in schema.indexes()],
+            varchar_columns={column.name(): column.length()
+                             for column in schema.varchar_columns()},
+            partition_column=schema.partition_column(),
+            partition_interval=schema.partition_interval(),
+            partitions=schema.partitions())
 
     def execute_query(self, signals):
         added_items = self._db.add_items(signals)
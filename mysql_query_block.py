@@ -1,31 +1,266 @@
-from nio.properties import Property, VersionProperty
+import ast
+from enum import Enum
+
+from nio.command import command
+from nio.command.params.string import StringParameter
+from nio.properties import Property, VersionProperty, BoolProperty, \
+    IntProperty, SelectProperty, ObjectProperty, PropertyHolder, \
+    TimeDeltaProperty
 from nio.signal.base import Signal
 
 from .mysql_base_block import MySQLBase
+from .result_cache import ResultCache
+
+
+class ResultFormat(Enum):
+    rows = "rows"
+    columns = "columns"
 
 
+class ResultCacheSettings(PropertyHolder):
+
+    """ Result cache settings, when enabled results of statements
+    producing rows are served from memory for repeated queries
+    Properties:
+        enabled (bool): Whether results are cached
+        ttl (timedelta): How long a result is served once stored
+        max_entries (int): Maximum number of cached results
+        max_bytes (int): Maximum estimated size of all cached results
+    """
+    enabled = BoolProperty(title='Enabled', default=False)
+    ttl = TimeDeltaProperty(title='Time To Live', default={"seconds": 60})
+    max_entries = IntProperty(title='Max Entries', default=1000)
+    max_bytes = IntProperty(title='Max Bytes', default=16777216)
+
+
+@command("invalidate_cache", StringParameter("prefix", default=""))
 class MySQLQuery(MySQLBase):
 
     """ A block for inserting data into a MySQL database.
     Properties:
         query: mysql statement to execute
+        query_parameters: values bound to query placeholders, when
+            provided query is used as a template
+        streaming: whether results are read from the server and notified
+            in chunks instead of being loaded at once
+        chunk_size: number of rows notified at once when streaming
+        result_format: whether a signal is notified per row, or a single
+            signal holding a list of values per column is notified per
+            result set, or per chunk when streaming
+        cache: Serve repeated queries from memory.
     """
     query = Property(
         title='Query', default="SELECT * from {{$table}}")
+    query_parameters = Property(title='Query Parameters', default='')
+    streaming = BoolProperty(title='Stream Results', default=False)
+    chunk_size = IntProperty(title='Chunk Size', default=1000)
+    result_format = SelectProperty(ResultFormat, title='Result Format',
+                                   default=ResultFormat.rows)
+    cache = ObjectProperty(ResultCacheSettings, title='Result Cache')
     version = VersionProperty("1.0.0")
 
+    def __init__(self):
+        super().__init__()
+        self._cache = None
+
+    def configure(self, context):
+        super().configure(context)
+        if self.cache().enabled():
+            self._cache = ResultCache(self.cache().ttl().total_seconds(),
+                                      self.cache().max_entries(),
+                                      self.cache().max_bytes())
+
+    def stats(self):
+        stats = super().stats()
+        if self._cache:
+            stats["cache"] = self._cache.stats()
+        return stats
+
+    def reset_stats(self):
+        super().reset_stats()
+        if self._cache:
+            self._cache.reset_stats()
+
+    def invalidate_cache(self, prefix=""):
+        """ Drops cached results, of queries starting with prefix when
+        provided
+
+        Returns:
+            number of results dropped
+        """
+        if self._cache:
+            return {"invalidated": self._cache.invalidate(prefix)}
+        return {"invalidated": 0}
+
     def execute_query(self, signals):
+        if self.streaming():
+            self._stream_query(signals)
+            return
+
+        requests = [(self.query(signal), self._get_parameters(signal))
+                    for signal in signals]
+        if all(self._db.returns_rows(query) for query, _ in requests):
+            # signals sharing the same statement and parameters get
+            # results of a single execution
+            keys = [self._get_request_key(query, parameters)
+                    for query, parameters in requests]
+            results = self._execute_requests(dict(zip(keys, requests)))
+            results = [results[key] for key in keys]
+        else:
+            # statements modifying data are executed for every signal,
+            # in signal order
+            results = self._execute_in_order(requests)
+
+        output = []
+        for rows, description in results:
+            if rows:
+                output.extend(self._get_result_signals(rows, description))
+        return output
+
+    def _execute_requests(self, requests):
+        """ Executes distinct statements producing rows, concurrently
+        when the connection pool allows it
+
+        Args:
+            requests: dict of (query, parameters) tuples by request key
+
+        Returns:
+            dict of (rows, description) tuples by request key
+        """
+        results = {}
+        row_keys = []
+        for key, (query, parameters) in requests.items():
+            cached = self._get_cached(key, query)
+            if cached is not None:
+                results[key] = cached
+            else:
+                row_keys.append(key)
+
+        executed = self._db.execute_statements(
+            [requests[key][0] for key in row_keys], "fetchall",
+            [requests[key][1] for key in row_keys])
+        results.update(zip(row_keys, executed))
+        if self._cache:
+            for key, result in zip(row_keys, executed):
+                self._cache.put(key, result)
+        return results
+
+    def _execute_in_order(self, requests):
+        """ Executes statements in signal order over a single connection,
+        adjacent parameterized statements not producing rows that share a
+        template are sent at once for all their parameter sets
+
+        Args:
+            requests: list of (query, parameters) tuples
+
+        Returns:
+            list of (rows, description) tuples in requests order
+        """
+        operations = []
+        # number of requests each operation stands for
+        counts = []
+        for query, parameters in requests:
+            many = parameters is not None and not self._db.returns_rows(query)
+            if many and operations and operations[-1][2] and \
+                    operations[-1][0] == query:
+                operations[-1][1].append(parameters)
+                counts[-1] += 1
+            else:
+                operations.append(
+                    (query, [parameters] if many else parameters, many))
+                counts.append(1)
+
+        executed = self._db.execute_in_order(operations, "fetchall")
+        results = []
+        for (query, parameters, many), result, count in zip(
+                operations, executed, counts):
+            if many:
+                # statements not producing rows have no result to notify
+                result = ((), None)
+            elif self._cache and self._db.returns_rows(query):
+                self._cache.put(self._get_request_key(query, parameters),
+                                result)
+            results.extend([result] * count)
+        return results
+
+    def _get_cached(self, key, query):
+        """ Provides cached result of a statement producing rows
+
+        Returns:
+            (rows, description) tuple, None when not cached
+        """
+        if self._cache and self._db.returns_rows(query):
+            return self._cache.get(key)
+
+    def _get_parameters(self, signal):
+        """ Evaluates query parameters for a signal
+
+        Returns:
+            list, tuple or dict of parameters, None when query is not
+            parameterized
+        """
+        parameters = self.query_parameters(signal)
+        if parameters is None or parameters == '':
+            return None
+        if isinstance(parameters, str):
+            try:
+                # text representing a list, tuple or dict of values
+                evaluated = ast.literal_eval(parameters)
+            except Exception:
+                # any other text is a value of its own
+                evaluated = None
+            if isinstance(evaluated, (list, tuple, dict)):
+                parameters = evaluated
+        if not isinstance(parameters, (list, tuple, dict)):
+            # a single value is bound to a single placeholder
+            parameters = (parameters,)
+        return parameters
+
+    @classmethod
+    def _get_request_key(cls, query, parameters):
+        return query, cls._freeze(parameters)
+
+    @classmethod
+    def _freeze(cls, value):
+        """ Provides a hashable equivalent of parameters, such as lists
+        bound to IN clauses
+        """
+        if isinstance(value, dict):
+            return tuple(sorted((key, cls._freeze(item))
+                                for key, item in value.items()))
+        elif isinstance(value, (list, tuple)):
+            return tuple(cls._freeze(item) for item in value)
+        elif isinstance(value, (set, frozenset)):
+            return frozenset(cls._freeze(item) for item in value)
+        return value
+
+    def _stream_query(self, signals):
+        """ Notifies query results in chunks as they arrive so that memory
+        use is bounded by chunk size instead of result size
+        """
         for signal in signals:
-            # evaluate resulting statement
             query = self.query(signal)
-            rows, description = self._db.execute_statement(query, "fetchall")
-            if rows:
-                # grab field names from description
-                field_names = [i[0] for i in description]
-                output = []
-                for row in rows:
-                    # create signal with resulting data
-                    signal_data = {field_names[i]: row[i]
-                                   for i in range(len(field_names))}
-                    output.append(Signal(signal_data))
-                return output
+            for rows, description in self._db.stream_statement(
+                    query, self.chunk_size(), self._get_parameters(signal)):
+                self.notify_signals(
+                    self._get_result_signals(rows, description))
+
+    def _get_result_signals(self, rows, description):
+        if self.result_format() == ResultFormat.columns:
+            return self._get_column_signals(rows, description)
+        return self._get_signals(rows, description)
+
+    @staticmethod
+    def _get_signals(rows, description):
+        # grab field names from description
+        field_names = tuple(i[0] for i in description)
+        # create a signal with resulting data for each row
+        return [Signal(dict(zip(field_names, row))) for row in rows]
+
+    @staticmethod
+    def _get_column_signals(rows, description):
+        """ Creates a single signal holding a list of values per column
+        """
+        field_names = [i[0] for i in description]
+        return [Signal({name: list(column)
+                        for name, column in zip(field_names, zip(*rows))})]
@@ -0,0 +1,132 @@
+import sys
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class ResultCache(object):
+    """ Query results kept in memory for a limited time
+
+    Entries expire ttl seconds after being stored, least recently used
+    entries are evicted when entry count or estimated size of results
+    exceeds its budget. Keys are (query, parameters) tuples.
+    """
+
+    def __init__(self, ttl, max_entries, max_bytes):
+        """ Create a cache
+
+        Args:
+            ttl: seconds an entry is served after being stored
+            max_entries: maximum number of entries
+            max_bytes: maximum estimated size of all entries
+        """
+        self._ttl = ttl
+        self._max_entries = max(1, max_entries)
+        self._max_bytes = max_bytes
+        self._lock = Lock()
+        # (expiration time, size, value) tuples by key, least recently
+        # used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """ Provides a cached value
+
+        Returns:
+            cached value, None when key is not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[2]
+                self._remove(key)
+                self._expirations += 1
+            self._misses += 1
+
+    def put(self, key, value, size=None):
+        """ Stores a value, values larger than the whole byte budget are
+        not stored
+
+        Args:
+            key: key value is retrieved with
+            value: value to store
+            size: size of value in bytes, estimated when not provided
+        """
+        if size is None:
+            size = self.estimate_size(value)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (monotonic() + self._ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or \
+                    self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self, prefix=None):
+        """ Removes entries
+
+        Args:
+            prefix: only entries whose query starts with prefix are
+                removed, all entries are removed when not provided
+
+        Returns:
+            number of entries removed
+        """
+        with self._lock:
+            if not prefix:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            keys = [key for key in self._entries if key[0].startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 3)
+                if lookups else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+            self._expirations = 0
+
+    @staticmethod
+    def estimate_size(value):
+        """ Estimates memory held by a (rows, description) result
+        """
+        rows, description = value
+        size = sys.getsizeof(rows) + sys.getsizeof(description)
+        for row in rows:
+            size += sys.getsizeof(row)
+            for column in row:
+                size += sys.getsizeof(column)
+        return size
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[1]
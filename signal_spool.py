@@ -0,0 +1,265 @@
+import os
+import pickle
+import struct
+from threading import Event, Lock, RLock
+from time import monotonic
+
+
+class SignalSpool(object):
+    """ Append-only, segment rotated on-disk store for signals
+
+    Each append writes a length prefixed record holding the pickled
+    signals to the current segment file, a new segment is started once
+    the current one reaches segment_size. Replay position is saved to a
+    checkpoint file after every replayed batch so that a replay
+    interrupted by a failure or a crash resumes where it stopped.
+    """
+
+    SEGMENT_SUFFIX = ".spool"
+    CHECKPOINT_FILE = "checkpoint"
+    RECORD_HEADER = struct.Struct(">I")
+
+    def __init__(self, directory, segment_size, max_size, logger=None):
+        """ Create a spool
+
+        Args:
+            directory: directory holding segment and checkpoint files
+            segment_size: size in bytes a segment grows to before a new
+                one is started
+            max_size: maximum size in bytes of all segments combined
+            logger: logger instance
+        """
+        self._directory = directory
+        self._segment_size = segment_size
+        self._max_size = max_size
+        self._logger = logger
+
+        self._lock = RLock()
+        self._replay_lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments = sorted(
+            int(name[:-len(self.SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(self.SEGMENT_SUFFIX))
+        self._size = sum(os.path.getsize(self._segment_path(segment))
+                         for segment in self._segments)
+        checkpoint_segment, _, _ = self._load_checkpoint()
+        self._last_segment = max(self._segments + [checkpoint_segment])
+        # segment being written, a new one is always started after a
+        # restart since the last one may end with a partial record
+        self._writer = None
+        self._writer_segment = None
+
+    def append(self, signals):
+        """ Stores signals
+
+        Returns:
+            True if signals were stored, False if spool is full
+        """
+        data = pickle.dumps(list(signals), pickle.HIGHEST_PROTOCOL)
+        record = self.RECORD_HEADER.pack(len(data)) + data
+        with self._lock:
+            if self._size + len(record) > self._max_size:
+                return False
+            if self._writer is None or \
+                    self._writer.tell() >= self._segment_size:
+                self._rotate()
+            self._writer.write(record)
+            self._writer.flush()
+            self._size += len(record)
+        return True
+
+    def replay(self, deliver, batch_size, rate=0, stop_event=None):
+        """ Delivers stored signals in batches, oldest first
+
+        Replay stops when all stored signals have been delivered, when
+        stop_event is set, or when deliver raises, in which case the
+        exception is propagated and the failed batch is delivered again
+        next time.
+
+        Args:
+            deliver: callable receiving a list of signals
+            batch_size: maximum number of signals delivered at once
+            rate: maximum signals per second, 0 for no limit
+            stop_event (Event): set to interrupt replay
+
+        Returns:
+            number of signals delivered
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            # another replay is in progress
+            return 0
+        try:
+            return self._replay(deliver, max(1, batch_size), rate,
+                                stop_event or Event())
+        finally:
+            self._replay_lock.release()
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                self._writer_segment = None
+
+    @property
+    def empty(self):
+        with self._lock:
+            return not self._segments
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def _replay(self, deliver, batch_size, rate, stop_event):
+        replayed = 0
+        started = monotonic()
+        checkpoint_segment, checkpoint_offset, checkpoint_skip = \
+            self._load_checkpoint()
+        with self._lock:
+            segments = [segment for segment in self._segments
+                        if segment >= checkpoint_segment]
+
+        for segment in segments:
+            if segment == checkpoint_segment:
+                offset, skip = checkpoint_offset, checkpoint_skip
+            else:
+                offset, skip = 0, 0
+
+            batch = []
+            for record_offset, next_offset, signals in \
+                    self._read_records(segment, offset):
+                for index in range(skip, len(signals)):
+                    batch.append(signals[index])
+                    if len(batch) < batch_size:
+                        continue
+                    if stop_event.is_set():
+                        return replayed
+                    deliver(batch)
+                    replayed += len(batch)
+                    batch = []
+                    if index + 1 < len(signals):
+                        self._save_checkpoint(segment, record_offset,
+                                              index + 1)
+                    else:
+                        self._save_checkpoint(segment, next_offset, 0)
+                    self._throttle(replayed, started, rate, stop_event)
+                skip = 0
+                offset = next_offset
+
+            if batch:
+                if stop_event.is_set():
+                    return replayed
+                deliver(batch)
+                replayed += len(batch)
+                self._save_checkpoint(segment, offset, 0)
+                self._throttle(replayed, started, rate, stop_event)
+            self._remove_segment(segment, offset)
+
+        return replayed
+
+    def _throttle(self, replayed, started, rate, stop_event):
+        if rate > 0:
+            delay = replayed / rate - (monotonic() - started)
+            if delay > 0:
+                stop_event.wait(delay)
+
+    def _read_records(self, segment, offset):
+        """ Reads records from a segment
+
+        Yields:
+            (record offset, next record offset, signals) tuples
+        """
+        try:
+            segment_file = open(self._segment_path(segment), "rb")
+        except FileNotFoundError:
+            return
+        with segment_file:
+            segment_file.seek(offset)
+            while True:
+                header = segment_file.read(self.RECORD_HEADER.size)
+                if len(header) < self.RECORD_HEADER.size:
+                    return
+                (length,) = self.RECORD_HEADER.unpack(header)
+                data = segment_file.read(length)
+                if len(data) < length:
+                    # record is still being written or was cut by a crash
+                    return
+                next_offset = offset + self.RECORD_HEADER.size + length
+                try:
+                    signals = pickle.loads(data)
+                except Exception:
+                    if self._logger:
+                        self._logger.exception(
+                            'Skipping unreadable spool record at: {0} in '
+                            'segment: {1}'.format(offset, segment))
+                    signals = []
+                yield offset, next_offset, signals
+                offset = next_offset
+
+    def _remove_segment(self, segment, replayed_offset):
+        """ Removes a segment once all of its records were replayed
+        """
+        with self._lock:
+            path = self._segment_path(segment)
+            if segment == self._writer_segment:
+                if self._writer.tell() > replayed_offset:
+                    # records were appended while replaying
+                    return
+                self._writer.close()
+                self._writer = None
+                self._writer_segment = None
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                size = 0
+            self._segments.remove(segment)
+            self._size -= size
+            if not self._segments:
+                self._remove_checkpoint()
+
+    def _rotate(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._last_segment += 1
+        self._writer_segment = self._last_segment
+        self._writer = open(self._segment_path(self._writer_segment), "ab")
+        self._segments.append(self._writer_segment)
+
+    def _segment_path(self, segment):
+        return os.path.join(self._directory, "{0:010d}{1}".format(
+            segment, self.SEGMENT_SUFFIX))
+
+    def _checkpoint_path(self):
+        return os.path.join(self._directory, self.CHECKPOINT_FILE)
+
+    def _load_checkpoint(self):
+        """ Provides replay position
+
+        Returns:
+            (segment, offset, signals already replayed from record at
+            offset) tuple
+        """
+        try:
+            with open(self._checkpoint_path()) as checkpoint_file:
+                segment, offset, skip = checkpoint_file.read().split()
+                return int(segment), int(offset), int(skip)
+        except (FileNotFoundError, ValueError):
+            return 0, 0, 0
+
+    def _save_checkpoint(self, segment, offset, skip):
+        # write to a temporary file first so that checkpoint is replaced
+        # atomically
+        path = self._checkpoint_path()
+        with open(path + ".tmp", "w") as checkpoint_file:
+            checkpoint_file.write("{0} {1} {2}".format(segment, offset, skip))
+        os.replace(path + ".tmp", path)
+
+    def _remove_checkpoint(self):
+        try:
+            os.remove(self._checkpoint_path())
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,47 @@
+import unittest
+from time import sleep
+
+from ...driver.commit_tracker import CommitPolicy, CommitTracker
+
+
+class TestCommitTracker(unittest.TestCase):
+
+    def test_statement(self):
+        tracker = CommitTracker(CommitPolicy.statement)
+        connection = object()
+        self.assertTrue(tracker.written(connection))
+        self.assertFalse(tracker.pending(connection))
+
+    def test_rows(self):
+        tracker = CommitTracker(CommitPolicy.rows, rows_per_commit=10)
+        connection1 = object()
+        connection2 = object()
+        self.assertFalse(tracker.written(connection1, 6))
+        self.assertFalse(tracker.written(connection2, 6))
+        self.assertEqual(tracker.uncommitted_rows, 12)
+        # rows are counted per connection
+        self.assertTrue(tracker.written(connection1, 4))
+
+        tracker.committed(connection1)
+        self.assertFalse(tracker.pending(connection1))
+        self.assertTrue(tracker.pending(connection2))
+        self.assertEqual(tracker.uncommitted_rows, 6)
+
+    def test_interval(self):
+        tracker = CommitTracker(CommitPolicy.interval, interval=0.05)
+        connection = object()
+        self.assertFalse(tracker.written(connection, 1))
+        sleep(0.06)
+        self.assertTrue(tracker.written(connection, 1))
+        tracker.committed(connection)
+        self.assertFalse(tracker.written(connection, 1))
+
+    def test_batch_and_on_close(self):
+        for policy in (CommitPolicy.batch, CommitPolicy.on_close):
+            tracker = CommitTracker(policy, rows_per_commit=1, interval=0)
+            connection = object()
+            # work is only committed when caller decides to
+            self.assertFalse(tracker.written(connection, 5))
+            self.assertTrue(tracker.pending(connection))
+            tracker.clear()
+            self.assertFalse(tracker.pending(connection))
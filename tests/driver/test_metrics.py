@@ -0,0 +1,48 @@
+import unittest
+
+from ...driver.metrics import LatencyHistogram, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        for milliseconds in [1] * 90 + [30] * 9 + [500]:
+            histogram.observe(milliseconds)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["min"], 1)
+        self.assertEqual(summary["max"], 500)
+        self.assertAlmostEqual(summary["mean"], 8.6)
+        # percentiles are bucket upper bounds
+        self.assertTrue(1 <= summary["p50"] < 2)
+        self.assertTrue(30 <= summary["p95"] < 60)
+        self.assertTrue(30 <= summary["p99"] < 60)
+        self.assertEqual(histogram.percentile(100), 500)
+
+    def test_histogram_beyond_last_bucket(self):
+        histogram = LatencyHistogram()
+        histogram.observe(10 ** 9)
+        self.assertEqual(histogram.percentile(50), 10 ** 9)
+
+    def test_counters_and_timers(self):
+        metrics = Metrics()
+        metrics.increment("rows", 10)
+        metrics.increment("rows")
+        with metrics.timer("query"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timer("query"):
+                raise ValueError()
+        self.assertEqual(metrics.counter("rows"), 11)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"], {"rows": 11})
+        self.assertIn("rows", snapshot["rates"])
+        self.assertEqual(snapshot["latency"]["query"]["count"], 2)
+
+        metrics.reset()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"], {})
+        self.assertEqual(snapshot["latency"], {})
@@ -7,6 +7,7 @@ from nio.util.threading import spawn
 
 # TODO, set this to False by default
 from ...driver.mysql import MySQL
+from ...driver.sql import ConflictMode
 
 skip_tests = False
 reason = ""
@@ -173,6 +174,68 @@ class TestMySQL(unittest.TestCase):
         table_name = self.my_sql.get_table_name(item)
         self.assertEqual(len(rows[table_name]), 2)
 
+    def test_add_item_after_external_schema_change(self):
+
+        item = Type1(1, "string1")
+        table_name = self.my_sql.get_table_name(item)
+        self.assertEqual(self.my_sql.add_items([item]), 1)
+
+        # drop a column behind the driver's back, cached definitions
+        # are now stale and have to be refreshed on insert failure
+        self.my_sql.execute_statement(
+            "ALTER TABLE {0} DROP COLUMN `field2`".format(table_name))
+        self.assertEqual(self.my_sql.add_items([Type1(2, "string2")]), 1)
+
+        rows = self.my_sql.dump()
+        self.assertEqual(len(rows[table_name]), 2)
+        self.assertEqual(len(rows[table_name][0]), 2)
+
+    def test_lazy_table_loading(self):
+
+        item = Type1(1, "string1")
+        table_name = self.my_sql.get_table_name(item)
+        self.my_sql.add_items([item])
+
+        # no table is introspected when connecting unless preloaded
+        lazy = MySQL("127.0.0.1", 3306, "nio_unittests",
+                     'root', 'mysqlroot', 10,
+                     logging.getLogger("test_MySQL"), self.get_table_name)
+        lazy.open()
+        self.assertNotIn(table_name, lazy._tables)
+        # table is loaded when first targeted
+        self.assertEqual(lazy.add_items([Type1(2, "string2")]), 1)
+        self.assertIn(table_name, lazy._tables)
+        lazy.close()
+
+        preloading = MySQL("127.0.0.1", 3306, "nio_unittests",
+                           'root', 'mysqlroot', 10,
+                           logging.getLogger("test_MySQL"),
+                           self.get_table_name,
+                           preload_tables=[table_name, "missing"])
+        preloading.open()
+        self.assertEqual(preloading._tables[table_name]["field_list"],
+                         ["field1", "field2"])
+        self.assertNotIn("missing", preloading._tables)
+        preloading.close()
+
+    def test_upsert(self):
+
+        upserting = MySQL("127.0.0.1", 3306, "nio_unittests",
+                          'root', 'mysqlroot', 10,
+                          logging.getLogger("test_MySQL"),
+                          self.get_table_name,
+                          conflict_mode=ConflictMode.update,
+                          key_columns=["field1"])
+        upserting.open()
+        self.assertEqual(upserting.add_items([Type1(1, "first"),
+                                              Type1(2, "first")]), 2)
+        # conflicting row updates existing row
+        self.assertEqual(upserting.add_items([Type1(1, "second")]), 1)
+        rows = upserting.dump()
+        self.assertEqual(sorted(rows["Type1"]),
+                         [(1, "second"), (2, "first")])
+        upserting.close()
+
     def test_two_item_types(self):
 
         item11 = Type1(11, "string11")
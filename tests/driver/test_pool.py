@@ -0,0 +1,135 @@
+import unittest
+from threading import Event, Thread
+from time import sleep
+from unittest.mock import Mock
+
+from ...driver.pool import ConnectionPool, PoolTimeout
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def test_open_creates_min_size(self):
+        factory = Mock(side_effect=lambda: Mock())
+        pool = ConnectionPool(factory, min_size=2, max_size=3)
+        pool.open()
+        self.assertEqual(factory.call_count, 2)
+        self.assertEqual(pool.size, 2)
+        self.assertEqual(pool.idle_count, 2)
+
+    def test_reuses_connections(self):
+        factory = Mock(side_effect=lambda: Mock())
+        pool = ConnectionPool(factory, max_size=2)
+        with pool.connection() as connection1:
+            pass
+        with pool.connection() as connection2:
+            pass
+        self.assertIs(connection1, connection2)
+        self.assertEqual(factory.call_count, 1)
+
+    def test_checkout_timeout(self):
+        pool = ConnectionPool(Mock, max_size=1, checkout_timeout=0.01)
+        connection = pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+
+    def test_checkout_waits_for_checkin(self):
+        pool = ConnectionPool(Mock, max_size=1, checkout_timeout=1)
+        connection = pool.checkout()
+        checked_out = Event()
+
+        def checkout():
+            pool.checkout()
+            checked_out.set()
+
+        Thread(target=checkout).start()
+        self.assertFalse(checked_out.wait(0.05))
+        pool.checkin(connection)
+        self.assertTrue(checked_out.wait(1))
+
+    def test_health_check(self):
+        broken = Mock()
+        healthy = Mock()
+        factory = Mock(side_effect=[broken, healthy])
+        validate = Mock(side_effect=lambda c: c.ping())
+        broken.ping.side_effect = Exception("gone away")
+        pool = ConnectionPool(factory, max_size=1, validate=validate,
+                              validate_after=0)
+        pool.checkin(pool.checkout())
+        # validation fails on broken connection, a new one is created
+        self.assertIs(pool.checkout(), healthy)
+        self.assertTrue(broken.close.called)
+        self.assertEqual(pool.size, 1)
+
+    def test_broken_connection_discarded(self):
+        pool = ConnectionPool(Mock, max_size=1,
+                              is_broken=lambda e: "lost" in str(e))
+        with self.assertRaises(Exception):
+            with pool.connection() as connection:
+                raise Exception("connection lost")
+        self.assertTrue(connection.close.called)
+        self.assertEqual(pool.size, 0)
+
+        with self.assertRaises(ValueError):
+            with pool.connection() as connection:
+                raise ValueError("bad value")
+        self.assertFalse(connection.close.called)
+        self.assertEqual(pool.idle_count, 1)
+
+    def test_idle_eviction(self):
+        pool = ConnectionPool(Mock, min_size=1, max_size=2,
+                              idle_timeout=0.01)
+        connection1 = pool.checkout()
+        connection2 = pool.checkout()
+        pool.checkin(connection1)
+        sleep(0.02)
+        # checking in evicts connections idle for too long
+        pool.checkin(connection2)
+        self.assertTrue(connection1.close.called)
+        self.assertEqual(pool.size, 1)
+
+    def test_close_callbacks(self):
+        before_close = Mock()
+        after_close = Mock()
+        pool = ConnectionPool(Mock, min_size=0, max_size=3, idle_timeout=0.01,
+                              before_close=before_close,
+                              after_close=after_close)
+        idle = pool.checkout()
+        broken = pool.checkout()
+        in_use = pool.checkout()
+        pool.checkin(idle)
+        sleep(0.02)
+        # evicted connection is prepared for closing, broken one is not
+        pool.checkin(broken, discard=True)
+        before_close.assert_called_once_with(idle)
+        self.assertEqual(after_close.call_count, 2)
+
+        # connections in use when the pool closes are prepared on checkin
+        pool.close()
+        pool.checkin(in_use)
+        before_close.assert_called_with(in_use)
+        after_close.assert_called_with(in_use)
+        self.assertEqual(before_close.call_count, 2)
+
+    def test_close(self):
+        pool = ConnectionPool(Mock, max_size=2)
+        idle = pool.checkout()
+        in_use = pool.checkout()
+        pool.checkin(idle)
+        pool.close()
+        self.assertTrue(idle.close.called)
+        self.assertFalse(in_use.close.called)
+        pool.checkin(in_use)
+        self.assertTrue(in_use.close.called)
+        self.assertEqual(pool.size, 0)
+        with self.assertRaises(RuntimeError):
+            pool.checkout()
+
+    def test_each_idle(self):
+        pool = ConnectionPool(Mock, min_size=2, max_size=2)
+        pool.open()
+        callback = Mock()
+        pool.each_idle(callback)
+        self.assertEqual(callback.call_count, 2)
+        self.assertEqual(pool.idle_count, 2)
@@ -0,0 +1,666 @@
+import unittest
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest.mock import Mock
+
+from ...driver.mysql import MySQL
+
+
+class TestSQL(unittest.TestCase):
+
+    def _get_driver(self, **kwargs):
+        return MySQL(None, None, None, None, None, None, Mock(), **kwargs)
+
+    def test_chunk_rows_by_count(self):
+        mysql = self._get_driver(insert_max_rows=2)
+        rows = ["(1)", "(2)", "(3)", "(4)", "(5)"]
+        chunks = list(mysql._chunk_rows(rows, 10))
+        self.assertEqual(chunks, [["(1)", "(2)"], ["(3)", "(4)"], ["(5)"]])
+
+    def test_chunk_rows_by_size(self):
+        mysql = self._get_driver(insert_max_rows=0, insert_max_bytes=30)
+        # each row takes 6 bytes including separator
+        rows = ["(123)"] * 5
+        chunks = list(mysql._chunk_rows(rows, 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 2])
+
+    def test_chunk_rows_by_statement_size(self):
+        mysql = self._get_driver(insert_max_bytes=1000)
+        mysql._max_statement_size = 22
+        chunks = list(mysql._chunk_rows(["(123)"] * 5, 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_chunk_rows_multibyte(self):
+        mysql = self._get_driver(insert_max_bytes=20)
+        # 'é' takes two bytes when encoded
+        chunks = list(mysql._chunk_rows(["('éé')", "('éé')"], 10))
+        self.assertEqual(len(chunks), 2)
+
+    def test_chunk_rows_oversized_row(self):
+        mysql = self._get_driver(insert_max_bytes=10)
+        chunks = list(mysql._chunk_rows(["(1)", "('long value')", "(2)"], 5))
+        self.assertEqual(chunks, [["(1)"], ["('long value')"], ["(2)"]])
+
+    def test_escape_row(self):
+        mysql = self._get_driver()
+        connection = Mock()
+        connection.escape.side_effect = lambda value: str(value)
+        self.assertEqual(mysql.escape_row(connection, [1, "a"]), "(1,a)")
+
+    def test_execute_statements(self):
+        mysql = self._get_driver(pool_max_size=2)
+        connections = []
+
+        def checkout():
+            connection = Mock()
+            connections.append(connection)
+            checked_out = Mock()
+            checked_out.__enter__ = Mock(return_value=connection)
+            checked_out.__exit__ = Mock(return_value=False)
+            return checked_out
+        mysql._checkout = checkout
+        executed = []
+
+        def execute_on(connection, statement, cursor_call, args):
+            executed.append((connection, statement))
+            return statement, args
+        mysql._execute_on = execute_on
+        # no executor when not connected, statements run in sequence
+        self.assertEqual(mysql.execute_statements(["SELECT a", "SELECT b"]),
+                         [("SELECT a", None), ("SELECT b", None)])
+        self.assertEqual(len(connections), 1)
+
+        mysql._executor = ThreadPoolExecutor(max_workers=2)
+        statements = ["SELECT a", "SELECT b", "SELECT c"]
+        self.assertEqual(mysql.execute_statements(statements),
+                         [(statement, None) for statement in statements])
+        self.assertEqual(len(connections), 4)
+
+        # writes run in order over a single connection with other statements
+        del connections[:], executed[:]
+        statements = ["UPDATE t SET a=1", "SELECT a FROM t", "DELETE FROM t"]
+        self.assertEqual(mysql.execute_statements(statements),
+                         [(statement, None) for statement in statements])
+        self.assertEqual(executed, [(connections[0], statement)
+                                    for statement in statements])
+        mysql._executor.shutdown()
+
+    def test_execute_in_order(self):
+        mysql = self._get_driver()
+        connection = Mock()
+        mysql._checkout = Mock()
+        mysql._checkout.return_value.__enter__ = Mock(return_value=connection)
+        mysql._checkout.return_value.__exit__ = Mock(return_value=False)
+        cursor = connection.cursor.return_value
+        cursor.executemany.return_value = 2
+        cursor.execute.return_value = 1
+        cursor.description = (("v",),)
+        cursor.fetchall.return_value = ((3,),)
+        self.assertEqual(mysql.execute_in_order([
+            ("UPDATE t SET v=%s", [[1], [2]], True),
+            ("SELECT v FROM t", None, False)], "fetchall"),
+            [(2, None), (((3,),), (("v",),))])
+        # statements ran in order over a single connection
+        self.assertEqual(mysql._checkout.call_count, 1)
+        self.assertEqual([call[0] for call in connection.mock_calls
+                          if call[0].startswith("cursor().execute")],
+                         ["cursor().executemany", "cursor().execute"])
+
+    def test_returns_rows(self):
+        mysql = self._get_driver()
+        self.assertTrue(mysql.returns_rows("SELECT * FROM t WHERE a=%s"))
+        self.assertTrue(mysql.returns_rows(" (select a from t)"))
+        self.assertTrue(mysql.returns_rows("show tables"))
+        self.assertFalse(mysql.returns_rows("UPDATE t SET a=%s"))
+        self.assertFalse(mysql.returns_rows("INSERT INTO t VALUES (%s)"))
+        # templates are analyzed once
+        self.assertIn("UPDATE t SET a=%s", mysql._templates)
+
+    def test_parse_columns(self):
+        mysql = self._get_driver()
+        table_fields = mysql.parse_columns([
+            ("t1", "a", "int"),
+            ("t1", "b", "DATETIME"),
+            ("t1", "c", b"text"),
+            ("t1", "d", "decimal"),
+            ("t2", "e", "double")
+        ])
+        self.assertEqual(
+            [(field.name, field.type) for field in table_fields["t1"]],
+            [("a", int), ("b", datetime), ("c", str), ("d", None)])
+        self.assertEqual(table_fields["t2"][0].type, float)
+
+    def test_adjust_tables_structure_signatures(self):
+        converted = []
+
+        class Item(object):
+            def __init__(self, **attributes):
+                self.__dict__.update(attributes)
+
+            def to_dict(self):
+                converted.append(self)
+                return dict(self.__dict__)
+        mysql = self._get_driver()
+        mysql._check_table = Mock()
+        items = [Item(a=i) for i in range(50)] + \
+            [Item(a=i, b=None) for i in range(50)] + [Item(a=0, b="x")]
+        mysql._adjust_tables_structure({"t": items})
+        # items are converted once per distinct attribute names
+        self.assertEqual(len(converted), 2)
+        mysql._check_table.assert_called_once_with(
+            "t", OrderedDict([("a", 0), ("b", None)]))
+
+    def test_table_fields_case(self):
+        mysql = self._get_driver()
+        mysql.execute_statement = Mock(return_value=(
+            [("niosignal", "a", "int"), ("other", "b", "text")], None))
+        # tables are reported in lower case by some servers
+        table_fields = mysql._get_table_fields(["NIOSignal", "other"])
+        self.assertEqual(sorted(table_fields), ["NIOSignal", "other"])
+        self.assertEqual(table_fields["NIOSignal"][0].name, "a")
+
+    def test_get_value_list_in_text_column(self):
+        mysql = self._get_driver()
+        self.assertEqual(mysql.get_value([1, 2], str), "[1,2]")
+        self.assertEqual(mysql.get_value({"a": (1, "b")}, str),
+                         '{"a":[1,"b"]}')
+
+    def test_get_type(self):
+        mysql = self._get_driver()
+        # integer columns do not depend on sample values
+        self.assertEqual(mysql.get_type(int, 1), "BIGINT")
+        self.assertEqual(mysql.get_type(int, -2 ** 31 - 1), "BIGINT")
+        self.assertEqual(mysql.get_type(bool, True), "BOOLEAN")
+        self.assertEqual(mysql.get_type(float), "DOUBLE")
+        self.assertEqual(mysql.get_type(datetime), "DATETIME(6)")
+        self.assertEqual(mysql.get_type(dict), "JSON")
+        self.assertEqual(mysql.get_type(list), "JSON")
+        self.assertEqual(mysql.get_type(bytes, b"a"), "BLOB")
+        self.assertEqual(mysql.get_type(bytes, bytes(65536)), "LONGBLOB")
+        self.assertEqual(mysql.get_type(str), "TEXT")
+        self.assertEqual(mysql.get_key_type(str), "VARCHAR(255)")
+        self.assertEqual(mysql.get_key_type(bytes, b"a"), "VARBINARY(255)")
+        self.assertEqual(mysql.get_key_type(int, 2 ** 40), "BIGINT")
+
+    def test_json_and_binary_values(self):
+        mysql = self._get_driver()
+        table_fields = mysql.parse_columns([
+            ("t", "doc", "json"), ("t", "raw", "varbinary"),
+            ("t", "data", "longblob")])
+        self.assertEqual([field.type for field in table_fields["t"]],
+                         [dict, bytes, bytes])
+        extract = mysql._compile_extractor(table_fields["t"])
+        now = datetime(2020, 1, 2, 3, 4, 5, 6)
+        item = Mock(spec=["doc", "raw", "data"],
+                    doc={"at": now, "values": [1.5, None]},
+                    raw=bytearray(b"\x00\xff"), data="text")
+        self.assertEqual(extract(item), [
+            '{"at":"2020-01-02T03:04:05.000006","values":[1.5,null]}',
+            b"\x00\xff", b"text"])
+        # text in a JSON column is a JSON string
+        self.assertEqual(extract(Mock(spec=["doc"], doc="a")),
+                         ['"a"', None, None])
+        # binary values are not bulk loaded
+        self.assertFalse(mysql.can_bulk_load(table_fields["t"]))
+        self.assertTrue(mysql.can_bulk_load(table_fields["t"][:1]))
+
+    def test_alter_table_adds_fields_at_once(self):
+        import pymysql
+        mysql = self._get_driver()
+        mysql._update_field_definitions = Mock()
+        mysql.execute_statement = Mock()
+        mysql._alter_table("t", OrderedDict([("a", 1), ("b", "text")]))
+        mysql.execute_statement.assert_called_once_with(
+            "ALTER TABLE t ADD COLUMN `a` BIGINT, ADD COLUMN `b` TEXT, "
+            "ALGORITHM=INSTANT")
+        mysql._update_field_definitions.assert_called_once_with("t")
+
+        # table has to be rebuilt, statement is retried without algorithm
+        mysql.execute_statement = Mock(side_effect=[
+            pymysql.err.OperationalError(1846, "not supported"), None])
+        mysql._alter_table("t", {"a": 1})
+        self.assertEqual(mysql.execute_statement.call_args[0][0],
+                         "ALTER TABLE t ADD COLUMN `a` BIGINT")
+        self.assertTrue(mysql._instant_alter)
+
+        # server does not support instant alters at all
+        mysql.execute_statement = Mock(side_effect=[
+            pymysql.err.OperationalError(1800, "unknown algorithm"), None])
+        mysql._alter_table("t", {"a": 1})
+        self.assertFalse(mysql._instant_alter)
+        mysql.execute_statement = Mock()
+        mysql._alter_table("t", {"a": 1})
+        mysql.execute_statement.assert_called_once_with(
+            "ALTER TABLE t ADD COLUMN `a` BIGINT")
+
+    def test_compile_extractor(self):
+        mysql = self._get_driver()
+        now = datetime.now()
+        extract = mysql._compile_extractor([
+            MySQL.FieldItem("a", int),
+            MySQL.FieldItem("b", str),
+            MySQL.FieldItem("c", datetime),
+            MySQL.FieldItem("d", None),
+            MySQL.FieldItem("odd 'name", float)
+        ])
+        item = Mock(spec=["a", "b", "c", "d"], a="1", b=2, c=now, d=3.5)
+        self.assertEqual(extract(item), [1, "2", now, 3.5, None])
+        # field of unknown type takes the type of the first value
+        self.assertEqual(extract(Mock(spec=["d"], d="4")), [
+            None, None, None, 4.0, None])
+
+        # a value failing conversion is kept as is
+        item = Mock(spec=["a", "b"], a="not a number", b=[1, 2])
+        self.assertEqual(extract(item), [
+            "not a number", "[1,2]", None, None, None])
+        self.assertTrue(mysql._logger.error.called)
+
+    def test_extractor_follows_table_definition(self):
+        mysql = self._get_driver()
+        mysql._update_field_definitions("t", [MySQL.FieldItem("a", int)])
+        item = Mock(spec=["a", "b"], a="1", b="2")
+        self.assertEqual(mysql._tables["t"]["extractor"](item), [1])
+        mysql._update_field_definitions("t", [MySQL.FieldItem("a", int),
+                                              MySQL.FieldItem("b", int)])
+        self.assertEqual(mysql._tables["t"]["extractor"](item), [1, 2])
+
+    def test_columnar_rows(self):
+        mysql = self._get_driver(insert_max_rows=2)
+        connection = Mock()
+        connection.escape.side_effect = \
+            lambda value: "NULL" if value is None else repr(value)
+        fields = [MySQL.FieldItem("a", int),
+                  MySQL.FieldItem("b", float),
+                  MySQL.FieldItem("c", bool),
+                  MySQL.FieldItem("d", str),
+                  MySQL.FieldItem("e", int)]
+        items = [Mock(spec=["a", "b", "c", "d", "e"],
+                      a=1, b=0.5, c=1, d="x", e=1),
+                 Mock(spec=["a", "b", "c", "d", "e"],
+                      a="2", b=2, c=False, d=3, e=None),
+                 Mock(spec=["a", "b", "c", "d", "e"],
+                      a=3, b=-1.25, c=True, d="z", e="bad")]
+        self.assertEqual(
+            list(mysql._get_columnar_rows(connection, fields, items)),
+            ["(1,0.5,1,'x',1)",
+             "(2,2.0,0,'3',NULL)",
+             "(3,-1.25,1,'z','bad')"])
+        # column holding values failing conversion is reported
+        self.assertTrue(mysql._logger.error.called)
+
+    def test_escape_array(self):
+        from array import array
+        import pymysql
+        mysql = self._get_driver()
+        self.assertEqual(list(mysql.escape_array(array("q", [1, -2]))),
+                         ["1", "-2"])
+        self.assertEqual(list(mysql.escape_array(array("d", [0.1, 1e20]))),
+                         ["0.1", "1e+20"])
+        with self.assertRaises(pymysql.err.ProgrammingError):
+            list(mysql.escape_array(array("d", [float("inf")])))
+
+    def test_format_load_value(self):
+        mysql = self._get_driver()
+        self.assertEqual(mysql.format_load_value(None), "\\N")
+        self.assertEqual(mysql.format_load_value(True), "1")
+        self.assertEqual(mysql.format_load_value(12), "12")
+        self.assertEqual(mysql.format_load_value(0.5), "0.5e0")
+        self.assertEqual(
+            mysql.format_load_value(datetime(2020, 1, 2, 3, 4, 5)),
+            "2020-01-02 03:04:05")
+        self.assertEqual(
+            mysql.format_load_value(datetime(2020, 1, 2, 3, 4, 5, 6)),
+            "2020-01-02 03:04:05.000006")
+        self.assertEqual(mysql.format_load_value("a\tb\\c\nd\r\0"),
+                         "a\\tb\\\\c\\nd\\r\\0")
+        # lists keep the encoding used on inserts
+        self.assertEqual(
+            mysql.format_load_value(mysql.get_value(["a\tb"], str)),
+            '["a\\\\tb"]')
+
+    def test_bulk_load(self):
+        from ...driver.sql import ConflictMode
+        mysql = self._get_driver()
+        loaded = []
+
+        def execute(statement):
+            # the client reads the file named in the statement
+            with open(statement.split("'")[1], "rb") as load_file:
+                loaded.append(load_file.read())
+            return 2
+        cursor = Mock()
+        cursor._result.warning_count = 0
+        cursor.execute.side_effect = execute
+        mysql._conflict_mode = ConflictMode.ignore
+
+        self.assertEqual(
+            mysql.bulk_load(cursor, "t", "`a`,`b`", [[1, "x"], [None, "y"]]),
+            2)
+        self.assertIn("IGNORE INTO TABLE t CHARACTER SET utf8 (`a`,`b`)",
+                      cursor.execute.call_args[0][0])
+        self.assertEqual(loaded, [b"1\tx\n\\N\ty\n"])
+
+        # when conflicts are errors, loads producing warnings are undone
+        statements = []
+
+        def execute_with_warnings(statement):
+            statements.append(statement.split(" '")[0])
+            if statement.startswith("LOAD DATA"):
+                cursor._result.warning_count = 1
+            return 2
+        cursor.execute.side_effect = execute_with_warnings
+        mysql._conflict_mode = ConflictMode.error
+        self.assertIsNone(mysql.bulk_load(cursor, "t", "`a`", [[1], [1]]))
+        self.assertEqual(statements, [
+            "SAVEPOINT nio_bulk_load", "LOAD DATA LOCAL INFILE",
+            "ROLLBACK TO SAVEPOINT nio_bulk_load"])
+
+        cursor._result.warning_count = 0
+        cursor.execute.side_effect = None
+        cursor.execute.return_value = 2
+        self.assertEqual(mysql.bulk_load(cursor, "t", "`a`", [[1], [2]]), 2)
+        self.assertEqual(cursor.execute.call_args[0][0],
+                         "RELEASE SAVEPOINT nio_bulk_load")
+
+        # warnings are queried when results do not hold their count
+        cursor = Mock(spec=["execute", "fetchone"])
+        cursor.fetchone.return_value = (0,)
+        self.assertEqual(mysql._get_warning_count(cursor), 0)
+        cursor.execute.assert_called_once_with("SHOW COUNT(*) WARNINGS")
+
+        # load failing before data is read does not leave writer blocked
+        cursor.execute.side_effect = RuntimeError("rejected")
+        with self.assertRaises(RuntimeError):
+            mysql.bulk_load(cursor, "t", "`a`", ([i] for i in range(100000)))
+
+    def test_commit_policy(self):
+        from ...driver.commit_tracker import CommitPolicy
+        # legacy flag commits after every statement
+        self.assertEqual(
+            MySQL(None, None, None, None, None, True,
+                  Mock())._commit_tracker.policy, CommitPolicy.statement)
+        self.assertEqual(self._get_driver()._commit_tracker.policy,
+                         CommitPolicy.on_close)
+
+        mysql = self._get_driver(commit_policy=CommitPolicy.rows,
+                                 commit_rows=5)
+        connection = Mock()
+        connection.cursor.return_value.execute.return_value = 3
+        connection.cursor.return_value.description = None
+        mysql._checkout = Mock()
+        mysql._checkout.return_value.__enter__ = Mock(return_value=connection)
+        mysql._checkout.return_value.__exit__ = Mock(return_value=False)
+
+        mysql.execute_statement("UPDATE t SET a=1")
+        self.assertEqual(mysql.uncommitted_rows, 3)
+        self.assertFalse(connection.commit.called)
+        mysql.execute_statement("UPDATE t SET a=2")
+        self.assertTrue(connection.commit.called)
+        self.assertEqual(mysql.uncommitted_rows, 0)
+
+        # statements producing result sets modify no rows
+        connection.cursor.return_value.description = (("a",),)
+        mysql.execute_statement("SELECT a FROM t")
+        self.assertEqual(mysql.uncommitted_rows, 0)
+        self.assertTrue(mysql._commit_tracker.pending(connection))
+
+    def test_evicted_connection_is_committed(self):
+        from time import sleep
+        mysql = self._get_driver(pool_min_size=0, pool_max_size=2,
+                                 pool_idle_timeout=0.01)
+        mysql.setup_connection = Mock(side_effect=lambda: Mock())
+        mysql.get_max_statement_size = Mock(return_value=None)
+        mysql.open()
+        pool = mysql.connection
+        idle = pool.checkout()
+        busy = pool.checkout()
+        mysql._statement_executed(idle, 5)
+        mysql._statement_executed(busy, 5)
+        pool.checkin(idle)
+        sleep(0.02)
+        pool.checkin(busy)
+        # idle connection is committed before being evicted
+        self.assertEqual(idle.commit.call_count, 1)
+        self.assertTrue(idle.close.called)
+        self.assertEqual(mysql.uncommitted_rows, 5)
+
+        # connection in use when the driver closes is committed on checkin
+        busy = pool.checkout()
+        mysql._statement_executed(busy, 2)
+        mysql.close()
+        pool.checkin(busy)
+        self.assertTrue(busy.commit.called)
+        self.assertEqual(mysql.uncommitted_rows, 0)
+
+    def test_stale_definitions_commit_inserted_rows(self):
+        import pymysql
+        from ...driver.commit_tracker import CommitPolicy
+        mysql = self._get_driver(insert_max_rows=1,
+                                 commit_policy=CommitPolicy.statement)
+        mysql._update_field_definitions("t", [MySQL.FieldItem("a", int)])
+        connection = Mock()
+        connection.escape.side_effect = str
+        connection.cursor.return_value.execute.side_effect = [
+            1, pymysql.err.OperationalError(1054, "Unknown column")]
+        mysql._checkout = Mock()
+        mysql._checkout.return_value.__enter__ = Mock(return_value=connection)
+        mysql._checkout.return_value.__exit__ = Mock(return_value=False)
+        mysql._adjust_tables_structure = Mock()
+        items = [Mock(spec=["a"], a=1), Mock(spec=["a"], a=2)]
+        # first chunk is inserted before definitions turn out stale
+        self.assertEqual(mysql._insert_items("t", items), 1)
+        self.assertEqual(connection.commit.call_count, 1)
+        # chunks are logged with their duration
+        message, rows, _, table, milliseconds = next(
+            call[0] for call in mysql._logger.debug.call_args_list
+            if call[0][0].startswith("Inserted"))
+        self.assertTrue(message.endswith("in %.2f ms"))
+        self.assertEqual((rows, table), (1, "t"))
+        self.assertGreaterEqual(milliseconds, 0)
+
+    def test_stats(self):
+        mysql = self._get_driver()
+        connection = Mock()
+        cursor = connection.cursor.return_value
+        cursor.execute.return_value = 2
+        cursor.description = (("a",),)
+        cursor.fetchall.return_value = [(1,), (2,)]
+        mysql.setup_connection = Mock(return_value=connection)
+        mysql.get_max_statement_size = Mock(return_value=None)
+        mysql.open()
+
+        mysql.execute_statement("SELECT a FROM t", "fetchall")
+        stats = mysql.stats()
+        self.assertEqual(stats["counters"], {
+            "connections_opened": 1, "queries": 1, "rows_returned": 2})
+        for name in ("connect", "query", "checkout_wait", "lock_wait"):
+            self.assertIn(name, stats["latency"])
+        self.assertEqual(stats["pool"], {"size": 1, "idle": 1})
+
+        mysql.reset_stats()
+        self.assertEqual(mysql.stats()["counters"], {})
+        mysql.close()
+
+    def test_slow_statements(self):
+        mysql = self._get_driver(slow_statement_threshold=0,
+                                 slow_statement_sample=2,
+                                 slow_statement_max_length=10)
+        for _ in range(4):
+            with mysql._timed_statement("query", "SELECT * FROM t", (1,)):
+                pass
+        # every slow statement is counted, one out of two is logged
+        self.assertEqual(mysql.metrics.counter("slow_statements"), 4)
+        self.assertEqual(mysql._logger.warning.call_count, 2)
+        args = mysql._logger.warning.call_args[0]
+        self.assertEqual(args[2], "SELECT * F... (5 more characters)")
+        self.assertEqual(args[3], "(1,)")
+
+        # statements under threshold are not logged
+        mysql = self._get_driver(slow_statement_threshold=60)
+        with mysql._timed_statement("query", "SELECT 1"):
+            pass
+        self.assertFalse(mysql._logger.warning.called)
+        self.assertEqual(mysql.metrics.counter("slow_statements"), 0)
+
+    def test_insert_tables(self):
+        mysql = self._get_driver(pool_max_size=2, insert_workers=2)
+        mysql._insert_items = Mock(side_effect=lambda table, items: len(items))
+        # no executor when not connected, tables inserted in sequence
+        self.assertEqual(mysql._insert_tables({"t1": [1, 2], "t2": [3]}), 3)
+
+        # tables are inserted into concurrently
+        barrier = Barrier(2, timeout=1)
+
+        def insert_items(table, items):
+            barrier.wait()
+            return len(items)
+        mysql._insert_items = Mock(side_effect=insert_items)
+        mysql._insert_executor = ThreadPoolExecutor(max_workers=2)
+        self.assertEqual(mysql._insert_tables({"t1": [1, 2], "t2": [3]}), 3)
+
+        # a failing table does not prevent others from being inserted
+        def insert_failing(table, items):
+            if table == "t1":
+                raise RuntimeError(table)
+            return len(items)
+        mysql._insert_items = Mock(side_effect=insert_failing)
+        with self.assertRaises(RuntimeError):
+            mysql._insert_tables({"t1": [1], "t2": [2], "t3": [3]})
+        self.assertEqual(mysql._insert_items.call_count, 3)
+        mysql._insert_executor.shutdown()
+
+    def test_route_items(self):
+        class Type1(object):
+            pass
+
+        class Signal(object):
+            pass
+
+        items = [Type1(), Signal(), Type1()]
+        # table names default to item class name
+        mysql = self._get_driver()
+        item_tables = mysql._route_items(items)
+        self.assertEqual(list(item_tables), ["Type1", "NIOSignal"])
+        self.assertEqual(item_tables["Type1"], [items[0], items[2]])
+
+        # target table is evaluated once per item
+        target_table = Mock(side_effect=lambda item: "t")
+        mysql = MySQL(None, None, None, None, None, None, Mock(),
+                      target_table,
+                      table_name_translations={"t": "translated"})
+        self.assertEqual(mysql._route_items(items), {"translated": items})
+        self.assertEqual(target_table.call_count, 3)
+
+        # constant target table is not evaluated per item
+        mysql = MySQL(None, None, None, None, None, None, Mock(), "Signal")
+        self.assertEqual(mysql._route_items(items), {"NIOSignal": items})
+        self.assertEqual(mysql.get_table_name(items[0]), "NIOSignal")
+        self.assertEqual(mysql._route_items([]), {})
+
+    def test_conflict_modes(self):
+        from ...driver.sql import ConflictMode
+        fields = [MySQL.FieldItem("id", str), MySQL.FieldItem("a", int),
+                  MySQL.FieldItem("b", float)]
+
+        def clauses(**kwargs):
+            mysql = self._get_driver(**kwargs)
+            return mysql.get_insert_clauses(
+                "t", "`id`,`a`,`b`", mysql._get_update_names(fields))
+
+        self.assertEqual(clauses(),
+                         ("INSERT INTO t (`id`,`a`,`b`) VALUES ", ""))
+        self.assertEqual(clauses(conflict_mode=ConflictMode.ignore)[0],
+                         "INSERT IGNORE INTO t (`id`,`a`,`b`) VALUES ")
+        self.assertEqual(clauses(conflict_mode=ConflictMode.replace)[0],
+                         "REPLACE INTO t (`id`,`a`,`b`) VALUES ")
+        # non key columns are updated unless update columns are given
+        self.assertEqual(
+            clauses(conflict_mode=ConflictMode.update, key_columns=["ID"]),
+            ("INSERT INTO t (`id`,`a`,`b`) VALUES ",
+             " ON DUPLICATE KEY UPDATE `a`=VALUES(`a`),`b`=VALUES(`b`)"))
+        self.assertEqual(
+            clauses(conflict_mode=ConflictMode.update, key_columns=["id"],
+                    update_columns=["b", "missing"])[1],
+            " ON DUPLICATE KEY UPDATE `b`=VALUES(`b`)")
+        # rows with nothing to update are left as they are
+        self.assertEqual(
+            clauses(conflict_mode=ConflictMode.update,
+                    key_columns=["id", "a", "b"]),
+            ("INSERT IGNORE INTO t (`id`,`a`,`b`) VALUES ", ""))
+
+    def test_create_table_with_key_columns(self):
+        mysql = self._get_driver(key_columns=["id", "site"])
+        mysql.execute_statement = Mock()
+        mysql._create_table("t", OrderedDict([("id", "x"), ("site", 1),
+                                              ("value", 1.5)]))
+        self.assertEqual(
+            mysql.execute_statement.call_args[0][0],
+            "CREATE TABLE IF NOT EXISTS t(`id` VARCHAR(255),"
+            "`site` BIGINT,`value` DOUBLE,UNIQUE KEY (`id`,`site`))")
+
+        # no partial unique key when key columns are missing
+        mysql._create_table("t", OrderedDict([("id", "x")]))
+        self.assertEqual(mysql.execute_statement.call_args[0][0],
+                         "CREATE TABLE IF NOT EXISTS t(`id` VARCHAR(255))")
+        self.assertTrue(mysql._logger.warning.called)
+
+    def test_create_table_with_schema_hints(self):
+        from ...driver.schema import SchemaHints
+        hints = SchemaHints(id_column="id", indexes=[["device", "time"]],
+                            varchar_columns={"Site": 32})
+        mysql = self._get_driver(schema_hints=hints)
+        mysql.execute_statement = Mock()
+        mysql._create_table("t", OrderedDict([
+            ("device", "a"), ("time", datetime(2026, 1, 1)), ("site", "b"),
+            ("note", "c")]))
+        self.assertEqual(
+            mysql.execute_statement.call_args[0][0],
+            "CREATE TABLE IF NOT EXISTS t("
+            "`id` BIGINT NOT NULL AUTO_INCREMENT,`device` VARCHAR(255),"
+            "`time` DATETIME(6),`site` VARCHAR(32),`note` TEXT,"
+            "PRIMARY KEY (`id`),INDEX (`device`,`time`))")
+        # generated ids are not updated on conflicts
+        self.assertEqual(mysql._get_update_names(
+            [MySQL.FieldItem("id", int), MySQL.FieldItem("device", str)]),
+            [])
+
+        # keys of partitioned tables include partition column
+        hints = SchemaHints(id_column="id", primary_key=["device"],
+                            partition_column="time", partitions=2)
+        mysql = self._get_driver(schema_hints=hints)
+        mysql.execute_statement = Mock()
+        mysql.get_partition_clause = Mock(return_value="PARTITION BY x")
+        mysql._create_table("t", OrderedDict([
+            ("device", "a"), ("time", datetime(2026, 1, 1))]))
+        self.assertEqual(
+            mysql.execute_statement.call_args[0][0],
+            "CREATE TABLE IF NOT EXISTS t("
+            "`id` BIGINT NOT NULL AUTO_INCREMENT,`device` VARCHAR(255),"
+            "`time` DATETIME(6),PRIMARY KEY (`device`,`time`),KEY (`id`)) "
+            "PARTITION BY x")
+
+        # tables are not partitioned on columns not holding dates
+        mysql._create_table("t", OrderedDict([("device", "a"),
+                                              ("time", 1)]))
+        self.assertNotIn("PARTITION", mysql.execute_statement.call_args[0][0])
+
+    def test_partition_clause(self):
+        from ...driver.schema import PartitionInterval
+        mysql = self._get_driver()
+        clause = mysql.get_partition_clause("time", PartitionInterval.month,
+                                            14)
+        self.assertTrue(clause.startswith(
+            "PARTITION BY RANGE (TO_DAYS(`time`)) (PARTITION p"))
+        self.assertEqual(clause.count("PARTITION p"), 15)
+        self.assertTrue(clause.endswith(
+            "PARTITION pmax VALUES LESS THAN MAXVALUE)"))
+        self.assertEqual(
+            mysql._next_period(datetime(2026, 12, 1).date(),
+                               PartitionInterval.month),
+            datetime(2027, 1, 1).date())
+        self.assertEqual(
+            mysql._next_period(datetime(2026, 12, 31).date(),
+                               PartitionInterval.day),
+            datetime(2027, 1, 1).date())
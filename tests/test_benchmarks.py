@@ -0,0 +1,42 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+from ..benchmarks import run_benchmarks
+from ..benchmarks.backends import FakeBackend
+from ..benchmarks.suites import item_table, make_items
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_quick_run(self):
+        report = run_benchmarks(FakeBackend(), rows=200, quick=True)
+        benchmarks = {result["benchmark"] for result in report["results"]}
+        self.assertEqual(benchmarks, {"add_items", "insert_modes",
+                                      "insert_workers", "schema_evolution",
+                                      "query", "reconnect"})
+        for result in report["results"]:
+            self.assertGreater(result["rows"], 0)
+            self.assertGreater(result["rows_per_second"], 0)
+        self.assertEqual(report["backend"]["name"], "fake")
+        # report is serializable as is
+        json.dumps(report)
+
+    def test_fake_server_stores_rows(self):
+        backend = FakeBackend()
+        db = backend.create_driver(item_table, Mock())
+        db.open()
+        db.add_items(make_items(["first", "second"], 10, 3))
+        self.assertEqual(backend.server.row_count("first"), 5)
+        self.assertEqual(backend.server.row_count("second"), 5)
+        rows, description = db.execute_statement("SELECT * FROM first",
+                                                 "fetchall")
+        self.assertEqual([field[0] for field in description],
+                         ["c0", "c1", "c2"])
+        self.assertEqual(len(rows), 5)
+        # gone connections fail once and are discarded
+        backend.break_connections()
+        with self.assertRaises(Exception):
+            db.add_items(make_items(["first"], 2, 3))
+        self.assertEqual(db.add_items(make_items(["first"], 2, 3)), 2)
+        db.close()
@@ -1,4 +1,5 @@
 import logging
+import tempfile
 from nio.signal.base import Signal
 from threading import Event
 from unittest.mock import Mock
@@ -98,3 +99,125 @@ class TestMySQLInsert(NIOBlockTestCase):
         blk.stop()
 
         self.assertTrue(blk._close_connection.called)
+
+    def test_write_behind(self):
+        blk = MySQLBase()
+        blk._connect = Mock()
+        blk.execute_query = Mock(return_value=None)
+        self.configure_block(blk, {
+            "host": "127.0.0.1",
+            "write_behind": {
+                "enabled": True,
+                "batch_size": 2,
+                "flush_interval": {"seconds": 0.01}
+            },
+            "log_level": logging.DEBUG
+        })
+        # pretend to be connected
+        blk._db.connection = Mock()
+        blk.start()
+        blk.process_signals([Signal(), Signal(), Signal()])
+        blk.stop()
+
+        # queued signals were processed in batches before stopping
+        self.assertEqual(blk.execute_query.call_count, 2)
+        stats = blk.queue_stats()
+        self.assertEqual(stats["drained"], 3)
+        self.assertEqual(stats["depth"], 0)
+
+    def test_spool(self):
+        blk = MySQLBase()
+        blk._connect = Mock()
+        blk.execute_query = Mock(return_value=None)
+        with tempfile.TemporaryDirectory() as directory:
+            self.configure_block(blk, {
+                "host": "127.0.0.1",
+                "spool": {
+                    "enabled": True,
+                    "directory": directory,
+                    "replay_rate": 0
+                },
+                "log_level": logging.DEBUG
+            })
+            blk.start()
+            # signals received while disconnected are spooled
+            blk.process_signals([Signal(), Signal()])
+            self.assertFalse(blk.execute_query.called)
+            self.assertFalse(blk._spool.empty)
+
+            # and replayed once connected
+            blk._db.connection = Mock()
+            blk._replay()
+            self.assertEqual(len(blk.execute_query.call_args[0][0]), 2)
+            self.assertTrue(blk._spool.empty)
+            blk.stop()
+
+    def test_spool_failed_delivery(self):
+        blk = MySQLBase()
+        blk._connect = Mock()
+        blk.execute_query = Mock(side_effect=MySQLLikeException())
+        with tempfile.TemporaryDirectory() as directory:
+            self.configure_block(blk, {
+                "host": "127.0.0.1",
+                "spool": {
+                    "enabled": True,
+                    "directory": directory,
+                    "replay_rate": 0
+                },
+                "log_level": logging.DEBUG
+            })
+            blk.start()
+            # link went down while connected, reconnecting fails
+            blk._db.connection = Mock()
+            blk._reconnect = Mock()
+            blk._reconnect.side_effect = \
+                lambda: setattr(blk._db, "connection", None)
+            blk.process_signals([Signal(), Signal()])
+            self.assertFalse(blk._spool.empty)
+            self.assertEqual(
+                blk.stats()["counters"]["signals_spooled"], 2)
+
+            # retry after reconnecting fails on connection too
+            blk._db.connection = Mock()
+            blk._reconnect.side_effect = None
+            blk.process_signals([Signal()])
+            self.assertEqual(blk.execute_query.call_count, 3)
+            self.assertEqual(
+                blk.stats()["counters"]["signals_spooled"], 3)
+            blk.stop()
+
+    def test_commit_per_batch(self):
+        blk = MySQLBase()
+        blk._connect = Mock()
+        blk.execute_query = Mock(return_value=None)
+        self.configure_block(blk, {
+            "host": "127.0.0.1",
+            "commit_policy": {"policy": "batch"},
+            "log_level": logging.DEBUG
+        })
+        # pretend to be connected
+        blk._db.connection = Mock()
+        blk._db.commit = Mock()
+        blk.start()
+        blk.process_signals([Signal(), Signal()])
+        self.assertEqual(blk._db.commit.call_count, 1)
+        blk.process_signals([Signal()])
+        self.assertEqual(blk._db.commit.call_count, 2)
+        blk.stop()
+
+    def test_stats(self):
+        blk = MySQLBase()
+        blk._connect = Mock()
+        self.configure_block(blk, {
+            "host": "127.0.0.1",
+            "write_behind": {"enabled": True},
+            "log_level": logging.DEBUG
+        })
+        blk._handle_signals([Signal(), Signal()])
+        stats = blk.stats()
+        self.assertEqual(stats["counters"]["signals_discarded"], 2)
+        self.assertIn("queue", stats)
+        self.assertEqual(stats["pool"]["size"], 0)
+
+        blk.reset_stats()
+        self.assertEqual(blk.stats()["counters"], {})
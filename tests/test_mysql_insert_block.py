@@ -1,4 +1,5 @@
 import logging
+from unittest.mock import Mock
 from nio import Signal
 from nio.testing.block_test_case import NIOBlockTestCase
 from ..mysql_insert_block import MySQLInsert
@@ -28,6 +29,28 @@ class TestMySQLInsert(NIOBlockTestCase):
         # assert than a signal containing inserted items count was received
         self.assertEqual(len(self._es_find_signals_notified), 1)
 
+    def test_target_table(self):
+        for target_table, constant in [
+                ("events", True),
+                ("{{ $__class__.__name__ }}", False),
+                ("events_{{ datetime.datetime.utcnow().strftime('%Y%m') }}",
+                 False)]:
+            insert_blk = MySQLInsert()
+            insert_blk._connect = Mock()
+            self.configure_block(insert_blk, {
+                "host": "127.0.0.1",
+                "target_table": target_table,
+                "log_level": logging.DEBUG
+            })
+            table = insert_blk.get_target_table()
+            # only plain names are evaluated once, time based names
+            # follow time
+            self.assertEqual(isinstance(table, str), constant)
+            if constant:
+                self.assertEqual(table, target_table)
+            else:
+                self.assertTrue(callable(table))
+
     def signals_notified(self, signals, output_id='default'):
         if hasattr(self, "_es_find_signals_notified"):
             self._es_find_signals_notified.extend(signals)
@@ -1,4 +1,5 @@
 import logging
+from unittest.mock import Mock
 from nio import Signal
 from nio.testing.block_test_case import NIOBlockTestCase
 from ..mysql_insert_block import MySQLInsert
@@ -41,3 +42,183 @@ class TestMySQLQuery(NIOBlockTestCase):
     def signals_notified(self, signals, output_id='default'):
         if hasattr(self, "_es_find_signals_notified"):
             self._es_find_signals_notified.extend(signals)
+
+    def test_streaming(self):
+        query_blk = MySQLQuery()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "credentials": {"username": "root", "password": "mysqlroot"},
+            "streaming": True,
+            "chunk_size": 1,
+            "query": "SELECT 1 AS a UNION ALL SELECT 2",
+            "log_level": logging.DEBUG
+        })
+        query_blk.start()
+
+        self._es_find_signals_notified = []
+        query_blk.process_signals([Signal()])
+        query_blk.stop()
+        # each row was notified in its own chunk
+        self.assertEqual(len(self._es_find_signals_notified), 2)
+        self.assertEqual(self._es_find_signals_notified[1].a, 2)
+
+    def test_process_all_signals(self):
+        query_blk = MySQLQuery()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "credentials": {"username": "root", "password": "mysqlroot"},
+            "query": "SELECT {{ $value }} AS a",
+            "log_level": logging.DEBUG
+        })
+        query_blk.start()
+
+        self._es_find_signals_notified = []
+        query_blk.process_signals([Signal({"value": 1}),
+                                   Signal({"value": 2}),
+                                   Signal({"value": 2})])
+        query_blk.stop()
+        # every signal got its results, repeated query included
+        self.assertEqual([signal.a for signal in
+                          self._es_find_signals_notified], [1, 2, 2])
+
+    def test_query_parameters(self):
+        query_blk = MySQLQuery()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "credentials": {"username": "root", "password": "mysqlroot"},
+            "query": "SELECT %s AS a, %s AS b",
+            "query_parameters": "{{ [$value, \"it's\"] }}",
+            "log_level": logging.DEBUG
+        })
+        query_blk.start()
+
+        self._es_find_signals_notified = []
+        query_blk.process_signals([Signal({"value": 1}),
+                                   Signal({"value": 2})])
+        query_blk.stop()
+        self.assertEqual([(signal.a, signal.b) for signal in
+                          self._es_find_signals_notified],
+                         [(1, "it's"), (2, "it's")])
+
+    def test_query_parameters_evaluation(self):
+        query_blk = MySQLQuery()
+        query_blk._connect = Mock()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "query": "SELECT * FROM t WHERE a IN %s AND b=%s",
+            "query_parameters": "{{ $parameters }}",
+            "log_level": logging.DEBUG
+        })
+        # text is a single value unless it represents a list of values
+        for parameters, expected in [("bob", ("bob",)), ("12", ("12",)),
+                                     ("0012", ("0012",)),
+                                     ("[1, 'x']", [1, "x"]),
+                                     (12, (12,))]:
+            self.assertEqual(query_blk._get_parameters(
+                Signal({"parameters": parameters})), expected)
+
+        # nested lists and dicts make hashable request keys
+        parameters = query_blk._get_parameters(
+            Signal({"parameters": [[1, 2], {"c": [3]}]}))
+        self.assertEqual(
+            query_blk._get_request_key("q", parameters),
+            ("q", ((1, 2), (("c", (3,)),))))
+        self.assertEqual(
+            hash(query_blk._get_request_key("q", parameters)),
+            hash(query_blk._get_request_key("q", [[1, 2], {"c": [3]}])))
+
+    def test_repeated_writes(self):
+        query_blk = MySQLQuery()
+        query_blk._connect = Mock()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "query": "{{ $query }}",
+            "log_level": logging.DEBUG
+        })
+        query_blk._db.execute_statements = Mock(
+            side_effect=lambda statements, cursor_call, args:
+            [((), None)] * len(statements))
+        query_blk._db.execute_in_order = Mock(
+            side_effect=lambda requests, cursor_call:
+            [((), None)] * len(requests))
+        update = "UPDATE counters SET n=n+1"
+        select = "SELECT n FROM counters"
+        # writes run for every signal
+        query_blk.execute_query([Signal({"query": update})] * 3)
+        self.assertEqual(
+            query_blk._db.execute_in_order.call_args[0][0],
+            [(update, None, False)] * 3)
+        # repeated lookups run once
+        query_blk.execute_query([Signal({"query": select})] * 2)
+        self.assertEqual(
+            query_blk._db.execute_statements.call_args[0][0], [select])
+
+    def test_ordered_parameterized_writes(self):
+        query_blk = MySQLQuery()
+        query_blk._connect = Mock()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "query": "{{ $query }}",
+            "query_parameters": "{{ $parameters }}",
+            "log_level": logging.DEBUG
+        })
+        query_blk._db.execute_in_order = Mock(
+            side_effect=lambda requests, cursor_call: [
+                (1, None) if many else (((2,),), (("v",),))
+                for _, _, many in requests])
+        update = "UPDATE t SET v=%s WHERE id=%s"
+        select = "SELECT v FROM t WHERE id=%s"
+        output = query_blk.execute_query([
+            Signal({"query": update, "parameters": [2, 1]}),
+            Signal({"query": update, "parameters": [2, 1]}),
+            Signal({"query": select, "parameters": [1]}),
+            Signal({"query": update, "parameters": [3, 1]})])
+        # adjacent writes are grouped, identical parameters included, and
+        # statements keep signal order
+        self.assertEqual(query_blk._db.execute_in_order.call_args[0][0], [
+            (update, [[2, 1], [2, 1]], True),
+            (select, [1], False),
+            (update, [[3, 1]], True)])
+        self.assertEqual([signal.v for signal in output], [2])
+
+    def test_columns_result_format(self):
+        query_blk = MySQLQuery()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "credentials": {"username": "root", "password": "mysqlroot"},
+            "query": "SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, 'y'",
+            "result_format": "columns",
+            "log_level": logging.DEBUG
+        })
+        query_blk.start()
+
+        self._es_find_signals_notified = []
+        query_blk.process_signals([Signal()])
+        query_blk.stop()
+        # a single signal holds every row
+        self.assertEqual(len(self._es_find_signals_notified), 1)
+        self.assertEqual(self._es_find_signals_notified[0].a, [1, 2])
+        self.assertEqual(self._es_find_signals_notified[0].b, ["x", "y"])
+
+    def test_result_cache(self):
+        query_blk = MySQLQuery()
+        self.configure_block(query_blk, {
+            "host": "127.0.0.1",
+            "credentials": {"username": "root", "password": "mysqlroot"},
+            "query": "SELECT {{ $value }} AS a",
+            "cache": {"enabled": True},
+            "log_level": logging.DEBUG
+        })
+        query_blk.start()
+
+        self._es_find_signals_notified = []
+        query_blk.process_signals([Signal({"value": 1})])
+        query_blk.process_signals([Signal({"value": 1})])
+        # repeated query is served from cache
+        self.assertEqual([signal.a for signal in
+                          self._es_find_signals_notified], [1, 1])
+        self.assertEqual(query_blk.stats()["cache"]["hits"], 1)
+        self.assertEqual(query_blk.stats()["counters"]["queries"], 1)
+        self.assertEqual(query_blk.invalidate_cache("SELECT 1"),
+                         {"invalidated": 1})
+        query_blk.stop()
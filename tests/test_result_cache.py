@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch
+
+from .. import result_cache
+from ..result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = ResultCache(60, 10, 1000)
+        key = ("SELECT 1", None)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ([(1,)], (("1",),)), 10)
+        self.assertEqual(cache.get(key), ([(1,)], (("1",),)))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.5)
+        self.assertEqual(stats["bytes"], 10)
+
+    def test_expiration(self):
+        cache = ResultCache(60, 10, 1000)
+        with patch.object(result_cache, "monotonic",
+                          return_value=100):
+            cache.put(("a", None), "value", 1)
+        with patch.object(result_cache, "monotonic",
+                          return_value=159):
+            self.assertEqual(cache.get(("a", None)), "value")
+        with patch.object(result_cache, "monotonic",
+                          return_value=160):
+            self.assertIsNone(cache.get(("a", None)))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        cache = ResultCache(60, 2, 1000)
+        cache.put(("a", None), 1, 1)
+        cache.put(("b", None), 2, 1)
+        # a becomes most recently used, b is evicted
+        cache.get(("a", None))
+        cache.put(("c", None), 3, 1)
+        self.assertIsNone(cache.get(("b", None)))
+        self.assertEqual(cache.get(("a", None)), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        # byte budget evicts as many entries as needed
+        cache = ResultCache(60, 10, 10)
+        cache.put(("a", None), 1, 4)
+        cache.put(("b", None), 2, 4)
+        cache.put(("c", None), 3, 8)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["bytes"], 8)
+        # values larger than the budget are not stored
+        cache.put(("d", None), 4, 11)
+        self.assertIsNone(cache.get(("d", None)))
+
+    def test_invalidate(self):
+        cache = ResultCache(60, 10, 1000)
+        cache.put(("SELECT * FROM devices WHERE id=1", None), 1, 1)
+        cache.put(("SELECT * FROM devices WHERE id=2", None), 2, 1)
+        cache.put(("SELECT * FROM sites", None), 3, 1)
+        self.assertEqual(cache.invalidate("SELECT * FROM devices"), 2)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["bytes"], 1)
+        self.assertEqual(cache.invalidate(), 1)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_estimate_size(self):
+        small = ResultCache.estimate_size(([(1, "a")], (("a",), ("b",))))
+        large = ResultCache.estimate_size(
+            ([(1, "a" * 1000)], (("a",), ("b",))))
+        self.assertGreater(large, small + 900)
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from ..signal_spool import SignalSpool
+
+
+class TestSignalSpool(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _delivered(self, deliver):
+        return [signal for call in deliver.call_args_list
+                for signal in call[0][0]]
+
+    def test_append_and_replay(self):
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        self.assertTrue(spool.empty)
+        spool.append([1, 2, 3])
+        spool.append([4, 5])
+        self.assertFalse(spool.empty)
+
+        deliver = Mock()
+        self.assertEqual(spool.replay(deliver, 2), 5)
+        self.assertEqual(deliver.call_args_list[0][0][0], [1, 2])
+        self.assertEqual(self._delivered(deliver), [1, 2, 3, 4, 5])
+        self.assertTrue(spool.empty)
+        self.assertEqual(spool.size, 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_segments_rotate(self):
+        spool = SignalSpool(self.directory, 10, 1024 * 1024)
+        for value in range(5):
+            spool.append([value])
+        self.assertEqual(len(os.listdir(self.directory)), 5)
+        deliver = Mock()
+        spool.replay(deliver, 100)
+        self.assertEqual(self._delivered(deliver), list(range(5)))
+
+    def test_max_size(self):
+        spool = SignalSpool(self.directory, 1024, 50)
+        self.assertTrue(spool.append([1]))
+        self.assertFalse(spool.append(["x" * 100]))
+
+    def test_replay_resumes_after_failure(self):
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        spool.append([1, 2, 3, 4, 5])
+        deliver = Mock(side_effect=[None, Exception("failed"), None, None])
+        with self.assertRaises(Exception):
+            spool.replay(deliver, 2)
+        # failed batch is delivered again
+        spool.replay(deliver, 2)
+        self.assertEqual(self._delivered(deliver), [1, 2, 3, 4, 3, 4, 5])
+
+    def test_replay_resumes_after_restart(self):
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        spool.append([1, 2, 3])
+        spool.append([4])
+        deliver = Mock(side_effect=[None, Exception("crash")])
+        with self.assertRaises(Exception):
+            spool.replay(deliver, 2)
+        spool.close()
+
+        # new instance picks up where previous one stopped
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        spool.append([5])
+        deliver = Mock()
+        spool.replay(deliver, 10)
+        self.assertEqual(self._delivered(deliver), [3, 4, 5])
+        self.assertTrue(spool.empty)
+
+    def test_partial_record_ignored(self):
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        spool.append([1])
+        spool.close()
+        # simulate a crash in the middle of writing a record
+        segment = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(segment, "ab") as segment_file:
+            segment_file.write(b"\x00\x00\x00\x10abc")
+
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        spool.append([2])
+        deliver = Mock()
+        spool.replay(deliver, 10)
+        self.assertEqual(self._delivered(deliver), [1, 2])
+
+    def test_replay_stops(self):
+        spool = SignalSpool(self.directory, 1024, 1024 * 1024)
+        spool.append([1, 2, 3])
+        stop_event = Mock()
+        stop_event.is_set.return_value = True
+        deliver = Mock()
+        self.assertEqual(spool.replay(deliver, 1, stop_event=stop_event), 0)
+        self.assertFalse(deliver.called)
+        self.assertFalse(spool.empty)
@@ -0,0 +1,80 @@
+import unittest
+from threading import Event
+from unittest.mock import Mock
+
+from ..write_behind_queue import WriteBehindQueue, OverflowPolicy
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+
+    def test_drains_full_batches(self):
+        drain = Mock()
+        queue = WriteBehindQueue(drain, 100, 2, 10)
+        queue.start()
+        queue.put([1, 2, 3, 4])
+        self.assertTrue(queue.flush(1))
+        queue.stop()
+        drain.assert_any_call([1, 2])
+        drain.assert_any_call([3, 4])
+        self.assertEqual(queue.stats()["drained"], 4)
+
+    def test_drains_on_interval(self):
+        drained = Event()
+        queue = WriteBehindQueue(lambda batch: drained.set(), 100, 10, 0.01)
+        queue.start()
+        queue.put([1])
+        # batch is not full, it is drained once interval elapses
+        self.assertTrue(drained.wait(1))
+        queue.stop()
+
+    def test_stop_drains_queue(self):
+        drain = Mock()
+        queue = WriteBehindQueue(drain, 100, 10, 10)
+        queue.start()
+        queue.put([1, 2, 3])
+        queue.stop(1)
+        drain.assert_called_once_with([1, 2, 3])
+
+    def test_drop_oldest(self):
+        drain = Mock()
+        queue = WriteBehindQueue(drain, 2, 10, 10,
+                                 overflow_policy=OverflowPolicy.drop_oldest)
+        self.assertEqual(queue.put([1, 2, 3]), 3)
+        stats = queue.stats()
+        self.assertEqual(stats["depth"], 2)
+        self.assertEqual(stats["dropped"], 1)
+        queue.start()
+        queue.stop(1)
+        drain.assert_called_once_with([2, 3])
+
+    def test_drop_newest(self):
+        drain = Mock()
+        queue = WriteBehindQueue(drain, 2, 10, 10,
+                                 overflow_policy=OverflowPolicy.drop_newest)
+        self.assertEqual(queue.put([1, 2, 3]), 2)
+        self.assertEqual(queue.stats()["dropped"], 1)
+        queue.start()
+        queue.stop(1)
+        drain.assert_called_once_with([1, 2])
+
+    def test_block(self):
+        drain = Mock()
+        queue = WriteBehindQueue(drain, 2, 2, 0.01,
+                                 overflow_policy=OverflowPolicy.block)
+        queue.start()
+        # producer waits for room instead of dropping
+        self.assertEqual(queue.put([1, 2, 3, 4, 5]), 5)
+        queue.stop(1)
+        drained = [signal for call in drain.call_args_list
+                   for signal in call[0][0]]
+        self.assertEqual(drained, [1, 2, 3, 4, 5])
+        self.assertEqual(queue.stats()["dropped"], 0)
+
+    def test_drain_failure_does_not_stop_worker(self):
+        drain = Mock(side_effect=[Exception("failed"), None])
+        queue = WriteBehindQueue(drain, 10, 1, 10, logger=Mock())
+        queue.start()
+        queue.put([1, 2])
+        self.assertTrue(queue.flush(1))
+        queue.stop()
+        self.assertEqual(drain.call_count, 2)
@@ -0,0 +1,206 @@
+from collections import deque
+from enum import Enum
+from threading import Condition, Thread
+from time import monotonic
+
+
+class OverflowPolicy(Enum):
+    block = "block"
+    drop_oldest = "drop_oldest"
+    drop_newest = "drop_newest"
+
+
+class WriteBehindQueue(object):
+    """ Bounded in-memory queue drained by worker threads
+
+    Signals put into the queue are handed in batches to the drain callable
+    from worker threads, a batch is drained as soon as batch_size signals
+    are queued or flush_interval elapsed, whatever happens first.
+    """
+
+    # seconds considered when computing drain rate
+    RATE_WINDOW = 60
+
+    def __init__(self, drain, capacity, batch_size, flush_interval,
+                 workers=1, overflow_policy=OverflowPolicy.block,
+                 logger=None):
+        """ Create a queue
+
+        Args:
+            drain: callable receiving a list of signals
+            capacity: maximum number of queued signals
+            batch_size: maximum number of signals drained at once
+            flush_interval: seconds to wait for a full batch
+            workers: number of worker threads draining the queue
+            overflow_policy (OverflowPolicy): what to do with incoming
+                signals when queue is full
+            logger: logger instance
+        """
+        self._drain = drain
+        self._capacity = max(1, capacity)
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = flush_interval
+        self._workers_count = max(1, workers)
+        self._overflow_policy = overflow_policy
+        self._logger = logger
+
+        self._queue = deque()
+        self._condition = Condition()
+        self._workers = []
+        self._stopping = False
+        self._in_flight = 0
+
+        self._enqueued = 0
+        self._dropped = 0
+        self._drained = 0
+        self._batches = 0
+        # (time, count) for batches drained within RATE_WINDOW
+        self._drain_history = deque()
+
+    def start(self):
+        self._stopping = False
+        for index in range(self._workers_count):
+            worker = Thread(target=self._work,
+                            name="WriteBehindQueue-{0}".format(index),
+                            daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def stop(self, timeout=None):
+        """ Stops accepting signals and waits for workers to drain the
+        queue
+
+        Args:
+            timeout: seconds to wait for each worker
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def put(self, signals):
+        """ Queues signals applying overflow policy when queue is full
+
+        Returns:
+            number of signals queued
+        """
+        queued = 0
+        with self._condition:
+            for signal in signals:
+                while len(self._queue) >= self._capacity:
+                    if self._stopping:
+                        break
+                    if self._overflow_policy is OverflowPolicy.drop_oldest:
+                        self._queue.popleft()
+                        self._dropped += 1
+                    elif self._overflow_policy is \
+                            OverflowPolicy.drop_newest:
+                        break
+                    else:
+                        self._condition.wait()
+                if len(self._queue) >= self._capacity:
+                    # signal is dropped since there is no room for it
+                    self._dropped += 1
+                    continue
+                self._queue.append(signal)
+                queued += 1
+            self._enqueued += queued
+            self._condition.notify_all()
+
+        if queued < len(signals) and self._logger:
+            self._logger.warning(
+                'Write-behind queue is full, dropped: {0} signals'.format(
+                    len(signals) - queued))
+        return queued
+
+    def flush(self, timeout=None):
+        """ Waits until queued signals have been drained
+
+        Returns:
+            True if queue was flushed within timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else \
+                    deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stats(self):
+        """ Provides queue monitoring figures
+        """
+        with self._condition:
+            self._trim_history()
+            recent = sum(count for _, count in self._drain_history)
+            return {
+                "depth": len(self._queue),
+                "capacity": self._capacity,
+                "in_flight": self._in_flight,
+                "enqueued": self._enqueued,
+                "drained": self._drained,
+                "dropped": self._dropped,
+                "batches": self._batches,
+                "drain_rate": recent / self.RATE_WINDOW
+            }
+
+    @property
+    def depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._in_flight += len(batch)
+                # wake up producers waiting for room
+                self._condition.notify_all()
+
+            try:
+                self._drain(batch)
+            except Exception:
+                if self._logger:
+                    self._logger.exception(
+                        'Failed to drain: {0} signals'.format(len(batch)))
+            finally:
+                with self._condition:
+                    self._in_flight -= len(batch)
+                    self._drained += len(batch)
+                    self._batches += 1
+                    self._drain_history.append((monotonic(), len(batch)))
+                    self._trim_history()
+                    self._condition.notify_all()
+
+    def _next_batch(self):
+        """ Waits for a batch to be due, must be called holding condition
+
+        Returns:
+            list of signals, None when worker has to exit
+        """
+        while True:
+            deadline = monotonic() + self._flush_interval
+            while len(self._queue) < self._batch_size and \
+                    not self._stopping:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self._queue:
+                count = min(self._batch_size, len(self._queue))
+                return [self._queue.popleft() for _ in range(count)]
+            if self._stopping:
+                return None
+
+    def _trim_history(self):
+        oldest_allowed = monotonic() - self.RATE_WINDOW
+        while self._drain_history and \
+                self._drain_history[0][0] < oldest_allowed:
+            self._drain_history.popleft()